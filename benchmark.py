@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import time
+from config import *
+from tables import *
+
+
+# scripts are run in a scratch directory for each stock size, so benchmarks do not touch buildings data, results, or plots
+# - get-data.py reads the real data, so it is run once (in its own directory) instead of for each size
+# - run-model.py is run once for each scenario without sharing years, which is the same as compute() for that scenario
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='time get-data.py, run-model.py, and make-plots.py on synthetic building stocks of several sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000,100000,1000000], help='numbers of buildings in synthetic stocks')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios, default=scenarios, help='scenarios to run (default: all)')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for buildings data and results')
+    parser.add_argument('--dir', default='benchmarks', help='directory for scratch files (default: benchmarks)')
+    parser.add_argument('--report', default='benchmark.json', help='file for report (default: benchmark.json)')
+    parser.add_argument('--no-plots', action='store_true', help='do not time make-plots.py')
+    args = parser.parse_args()
+
+    # make-plots.py plots all scenarios, so it needs results for all of them
+    plots = not args.no_plots and set(args.scenarios) == set(scenarios)
+    if not args.no_plots and not plots:
+        print('not timing make-plots.py, since it needs results for all scenarios')
+
+    runs = []
+
+    # buildings data to sample stocks from
+    # - without raw data, sample from existing buildings data
+    if os.path.isdir('data'):
+        source_dir = make_dir(os.path.join(args.dir,'source'))
+        link_data(source_dir)
+        runs.append(run_stage('get-data.py', ['--format',args.format], source_dir, None, None))
+        source = os.path.abspath(os.path.join(source_dir,'buildings'))
+    else:
+        print('no data directory, sampling stocks from existing buildings data')
+        source = os.path.abspath('buildings')
+
+    for size in args.sizes:
+        size_dir = make_dir(os.path.join(args.dir,str(size)))
+        runs.append(run_stage('make-stock.py', ['--size',str(size),'--source',source,'--format',args.format], size_dir, size, None))
+        for scenario in args.scenarios:
+            runs.append(run_stage('run-model.py', ['--format',args.format,'--no-share','--scenarios',scenario], size_dir, size, scenario))
+        if plots:
+            runs.append(run_stage('make-plots.py', ['--force'], size_dir, size, None))
+
+    report = {'machine': machine_info(),
+              'scenarios': args.scenarios,
+              'runs': runs}
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('wrote %s' % args.report)
+
+
+def run_stage(script, script_args, cwd, size, scenario):
+
+    # run script and measure wall time and peak resident memory of its process
+    # - wait4 gives resource usage of just this process (ru_maxrss is in KB on linux and bytes on macos)
+    print('running %s in %s' % (' '.join([script] + script_args),cwd), flush=True)
+    t = time.time()
+    with open(os.path.join(cwd,'%s.log' % os.path.splitext(script)[0]), 'a') as log:
+        proc = subprocess.Popen([sys.executable, os.path.join(script_dir,script)] + script_args, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        pid, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.time() - t
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, script)
+
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    print('  %.2f s, %.1f MB' % (wall_time,peak_rss / 1e6))
+
+    return {'stage': os.path.splitext(script)[0],
+            'size': size,
+            'scenario': scenario,
+            'wall time': wall_time,
+            'peak rss': peak_rss}
+
+
+def make_dir(dir_name):
+
+    if not os.path.isdir(dir_name):
+        os.makedirs(dir_name)
+
+    return dir_name
+
+
+def link_data(dir_name):
+
+    # get-data.py reads data/ in working directory
+    link_name = os.path.join(dir_name,'data')
+    if not os.path.exists(link_name):
+        os.symlink(os.path.abspath('data'), link_name)
+
+
+def machine_info():
+
+    info = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpus': os.cpu_count()}
+    try:
+        info['commit'] = subprocess.run(['git','describe','--always','--dirty'], cwd=script_dir,
+                                        capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    return info
+
+
+if __name__ == '__main__':
+    main()
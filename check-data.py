@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+import argparse
+import importlib.util
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import time
+from config import *
+
+
+# checks of get-data.py that do not need the raw data
+# - get-data.py is loaded as a module (its name has a dash, so it cannot be imported)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='check parsing and sampling in get-data.py')
+    parser.add_argument('--draws', type=int, default=2000000, help='number of buildings to sample for checking distribution of samples (default: 2000000)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000,100000,1000000], help='numbers of buildings to time sampling for')
+    args = parser.parse_args()
+
+    get_data = load_script('get-data.py')
+
+    check_parse_nums(get_data)
+    check_sample_bins(get_data, args.draws)
+    time_sample_bins(get_data, args.sizes)
+
+    print('all checks passed')
+
+
+def load_script(script):
+
+    spec = importlib.util.spec_from_file_location(script.replace('-','_')[:-3], os.path.join(script_dir,script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def check_parse_nums(get_data):
+
+    # numbers in arch data are parsed the same as stripping, removing thousands separators, and calling float()
+    # - padded dashes and blanks (from spreadsheet exports of empty cells) are missing values
+    cells = ['20036', '20,036', ' 20,036 ', '1,234.5', ' 7', '-', ' - ', '', '  ', '1e3', '0.1']
+    expected = []
+    for cell in cells:
+        cell = cell.replace(',','').strip()
+        expected.append(np.nan if cell in ['','-'] else float(cell))
+
+    # read them from a file in chunks, as get_architecture_2030_data does
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'arch.csv')
+        pd.DataFrame({'type': ['x'] * len(cells), 'area': cells}).to_csv(file_name, index=False)
+        chunks = list(get_data.read_csv_chunks(file_name, {'type': 'type'}, {'area': 'area'}, ['','-'], 4, padded=True))
+    vals = pd.concat(chunks)['area'].to_numpy()
+
+    if not np.array_equal(vals, expected, equal_nan=True):
+        raise AssertionError('parsed %s as %s instead of %s' % (cells,list(vals),expected))
+    print('parse numbers: %d cells parsed as expected' % len(cells))
+
+
+def synthetic_histograms(num_types=18, num_bins=25):
+
+    # histograms like the ones for arch types, with some empty bins
+    rng = get_rng('check', 'histograms')
+    probs = rng.random((num_types, num_bins))
+    probs[rng.random((num_types, num_bins)) < 0.2] = 0.0
+    probs /= probs.sum(axis=1)[:, np.newaxis]
+    edges = np.cumsum(rng.random((num_types, num_bins+1)), axis=1) + rng.normal(size=(num_types, 1))
+
+    return probs, edges
+
+
+def check_sample_bins(get_data, num_draws):
+
+    # every sample is in the range of its histogram and in a bin with nonzero probability
+    # - counts in bins for each histogram pass a chi-square test against probabilities (at 99.9%, with critical value from the Wilson-Hilferty approximation)
+    probs, edges = synthetic_histograms()
+    rows = get_rng('check', 'rows').integers(len(probs), size=num_draws)
+    vals = get_data.sample_bins(get_rng('check', 'sample'), rows, probs, edges)
+
+    if ((vals < edges[rows, 0]) | (vals > edges[rows, -1])).any():
+        raise AssertionError('sampled values outside range of histogram')
+
+    worst = 0.0
+    for row in range(len(probs)):
+        bin_idxs = np.searchsorted(edges[row], vals[rows == row], side='right') - 1
+        cnts = np.bincount(np.minimum(bin_idxs, probs.shape[1]-1), minlength=probs.shape[1])
+        nonzero = probs[row] > 0
+        if cnts[~nonzero].any():
+            raise AssertionError('sampled empty bins of histogram %d' % row)
+        expected = cnts.sum() * probs[row, nonzero]
+        chi2 = ((cnts[nonzero] - expected)**2 / expected).sum()
+        dof = nonzero.sum() - 1
+        crit = dof * (1 - 2/(9*dof) + 3.0902*np.sqrt(2/(9*dof)))**3
+        if chi2 > crit:
+            raise AssertionError('bin counts of histogram %d do not match probabilities (chi-square %.1f with %d dof, critical value %.1f)' % (row,chi2,dof,crit))
+        worst = max(worst, chi2 / crit)
+    print('sample bins: %d samples in range and in nonempty bins, largest chi-square is %.2f of critical value' % (num_draws,worst))
+
+
+def time_sample_bins(get_data, sizes):
+
+    # time per building for sampling all buildings at once
+    probs, edges = synthetic_histograms()
+    for size in sizes:
+        rows = get_rng('check', 'rows', size).integers(len(probs), size=size)
+        rng = get_rng('check', 'sample', size)
+        t = time.perf_counter()
+        get_data.sample_bins(rng, rows, probs, edges)
+        t = time.perf_counter() - t
+        print('sample bins: %d buildings in %.3f s (%.0f ns per building)' % (size,t,t / size * 1e9))
+
+
+if __name__ == '__main__':
+    main()
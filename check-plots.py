@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import argparse
+import importlib.util
+import numpy as np
+import os
+from config import *
+from tables import *
+
+
+# checks of make-plots.py against results written by run-model.py
+# - make-plots.py is loaded as a module (its name has a dash, so it cannot be imported)
+# - by-type and by-area series are rebuilt from results tables one building group, year, fuel, and policy at a time (as make-plots.py used to)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='check stacked by-type and by-area series in make-plots.py against results')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios, default=scenarios, help='scenarios to check (default: all)')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='relative tolerance for series (default: 1e-9)')
+    args = parser.parse_args()
+
+    make_plots = load_script('make-plots.py')
+
+    for scenario in args.scenarios:
+        results = read_results(scenario)
+        for quantity in ['energy','emissions']:
+            weights = make_plots.get_weights(quantity)
+            check_series(make_plots.quantity_by_type(scenario, quantity), results, 'type', weights, args.rtol)
+            check_series(make_plots.quantity_by_area(scenario, quantity), results, 'area', weights, args.rtol)
+
+    print('all checks passed')
+
+
+def load_script(script):
+
+    spec = importlib.util.spec_from_file_location(script.replace('-','_')[:-3], os.path.join(script_dir,script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def read_results(scenario):
+
+    # codes and first year of energy use by building, and reductions by [building, year, policy, fuel]
+    name = os.path.join('results',scenario.replace(' ','-'))
+    en_cols = ['%d %s' % (years[0],fuel) for fuel in fuels]
+    data = read_table(name, ['type code','area code'] + en_cols)
+    reduct_cols = []
+    for year in years[1:]:
+        for policy in policies:
+            for fuel in fuels:
+                reduct_cols.append('%d %s %s reduct' % (year,policy,fuel))
+    reduct_data = sparse_to_frame(read_sparse_table('%s_reducts' % name), reduct_cols)
+
+    reducts = np.zeros((len(data), len(years), len(policies), len(fuels)))
+    reducts[:,1:] = reduct_data.to_numpy().reshape((len(data), len(years)-1, len(policies), len(fuels)))
+
+    return {'type code': data['type code'].to_numpy(),
+            'area code': data['area code'].to_numpy(),
+            'energy': data[en_cols].to_numpy(),
+            'reduct': reducts}
+
+
+def check_series(job, results, by, weights, rtol):
+
+    # group of each building (in order of labels of plot)
+    # - for types, types that are not in labels are in last group (all others combined)
+    if by == 'type':
+        group_idxs = dict((bldg_types.index(label), i) for i, label in enumerate(job['labels'][:-1]))
+        groups = np.array([group_idxs.get(code, len(job['labels'])-1) for code in results['type code']])
+    else:
+        groups = results['area code']
+
+    init_val = 0.0
+    for f in range(len(fuels)):
+        init_val += results['energy'][:,f].sum() * weights[fuels[f]]
+
+    # percent of initial value left after reductions in each group and all groups before it
+    values = []
+    for g in range(len(job['labels'])):
+        vals = [init_val]
+        for y in range(1,len(years)):
+            val = vals[y-1]
+            for i in range(g+1):
+                idx = groups == i
+                for f in range(len(fuels)):
+                    for p in range(len(policies)):
+                        val -= results['reduct'][idx,y,p,f].sum() * weights[fuels[f]]
+            vals.append(val)
+        values.append([100*val/init_val for val in vals])
+
+    if not np.allclose(job['values'], values, rtol=rtol, atol=0):
+        diff = np.abs(np.array(job['values']) - np.array(values)).max()
+        raise AssertionError('%s: series differ from results by up to %g' % (job['file'],diff))
+    print('%s: %d series match results' % (job['file'],len(values)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import argparse
+import filecmp
+import glob
+import numpy as np
+import os
+import subprocess
+import sys
+import tempfile
+from config import *
+from tables import *
+
+
+# check that a run resumed from checkpoints writes the same results as a run that was not stopped
+# - runs are in a scratch directory on a synthetic stock, so the check does not touch buildings data, results, or checkpoints
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='check that run-model.py --resume gives the same results as a full run')
+    parser.add_argument('--size', type=int, default=1000, help='number of buildings in synthetic stock (default: 1000)')
+    parser.add_argument('--source', default='buildings', help='table of buildings to sample stock from (default: buildings)')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios, default=scenarios, help='scenarios to run (default: all)')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for results')
+    parser.add_argument('--jobs', type=int, default=1, help='number of processes for run-model.py')
+    parser.add_argument('--checkpoint-years', type=int, default=5, metavar='N', help='save state every N years (default: 5)')
+    parser.add_argument('--stop-year', type=int, default=years[len(years)//2], help='remove checkpoints after this year before resuming (default: %d)' % years[len(years)//2])
+    args = parser.parse_args()
+
+    model_args = ['--format',args.format,'--jobs',str(args.jobs),'--checkpoint-years',str(args.checkpoint_years),'--scenarios'] + args.scenarios
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        # full run, saving state
+        run_script('make-stock.py', ['--size',str(args.size),'--source',os.path.abspath(args.source),'--format',args.format], tmp_dir)
+        run_script('run-model.py', model_args, tmp_dir)
+        os.rename(os.path.join(tmp_dir,'results'), os.path.join(tmp_dir,'full-results'))
+
+        # resume after removing state saved after stop year, as if the run had died then
+        num_kept = remove_checkpoints(tmp_dir, args.stop_year)
+        output = run_script('run-model.py', model_args + ['--resume'], tmp_dir)
+        num_resumed = output.count('resuming ')
+        print('resumed %d groups of scenarios from %d checkpoints' % (num_resumed,num_kept))
+        if num_kept and not num_resumed:
+            raise AssertionError('run did not resume from any of %d checkpoints' % num_kept)
+
+        compare_dirs(os.path.join(tmp_dir,'full-results'), os.path.join(tmp_dir,'results'))
+
+    print('all checks passed')
+
+
+def run_script(script, script_args, cwd):
+
+    # run script and return its output
+    print('running %s' % ' '.join([script] + script_args), flush=True)
+    proc = subprocess.run([sys.executable, os.path.join(script_dir,script)] + script_args, cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stdout + proc.stderr)
+        raise subprocess.CalledProcessError(proc.returncode, script)
+
+    return proc.stdout
+
+
+def remove_checkpoints(dir_name, stop_year):
+
+    # remove checkpoints for years after stop year, and return number of checkpoints kept
+    # - checkpoints have all years so far, so number of years gives year of checkpoint
+    num_kept = 0
+    for file_name in glob.glob(os.path.join(dir_name,'checkpoints','*.npz')):
+        with np.load(file_name) as f:
+            year = years[f['ens'].shape[1] - 1]
+        if year > stop_year:
+            os.remove(file_name)
+        else:
+            num_kept += 1
+
+    return num_kept
+
+
+def compare_dirs(dir_name, other_dir_name):
+
+    # compare files in both directories byte for byte
+    file_names = sorted(os.listdir(dir_name))
+    other_file_names = sorted(os.listdir(other_dir_name))
+    if file_names != other_file_names:
+        raise AssertionError('resumed run wrote %s instead of %s' % (other_file_names,file_names))
+    match, mismatch, errors = filecmp.cmpfiles(dir_name, other_dir_name, file_names, shallow=False)
+    if mismatch or errors:
+        raise AssertionError('resumed run wrote different %s' % ', '.join(mismatch + errors))
+    print('compare results: %d files are the same' % len(match))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import numpy as np
+import zlib
 
 
 scenarios = ['Basecase',
@@ -52,8 +53,8 @@ bldg_types = ['Distribution Center',
               'Warehouse',
               'Worship Facility']
 
-com_types = filter(lambda typ: 'Multifamily' not in typ, bldg_types)
-mult_types = filter(lambda typ: 'Multifamily' in typ, bldg_types)
+com_types = list(filter(lambda typ: 'Multifamily' not in typ, bldg_types))
+mult_types = list(filter(lambda typ: 'Multifamily' in typ, bldg_types))
 
 areas = [('<20k ft$^2$', -np.inf, 20e3),
          ('20k-50k ft$^2$', 20e3, 50e3),
@@ -61,11 +62,50 @@ areas = [('<20k ft$^2$', -np.inf, 20e3),
          ('90k-220k ft$^2$', 90e3, 220e3),
          ('>220k ft$^2$', 220e3, np.inf)]
 
+
+def get_type_codes(types):
+
+    # code for each building type (position in bldg_types)
+    # - types not in bldg_types get code len(bldg_types)
+    uniq_types, inv = np.unique(np.asarray(types, dtype=str), return_inverse=True)
+    uniq_codes = np.full(len(uniq_types), len(bldg_types), dtype=np.int64)
+    for u in range(len(uniq_types)):
+        if uniq_types[u] in bldg_types:
+            uniq_codes[u] = bldg_types.index(uniq_types[u])
+
+    return uniq_codes[inv]
+
+
+def get_area_codes(area):
+
+    # code for each floor area (position of bin in areas)
+    bounds = [area_max for area_lab, area_min, area_max in areas[:-1]]
+
+    return np.searchsorted(bounds, area, side='right')
+
 # kgCO2e/kBtu
 ghg_factors = {'elec': 6.164e-3,
                'gas': 52.98e-3,
                'steam': 52.99e-3}
 
+# seed for all random sampling
+rand_seed = 0
+
+
+def get_rng(*keys):
+
+    # random number generator for one piece of work (e.g., scenario, policy, target, year)
+    # - same keys always give same numbers, regardless of what else has been run or in what order
+    # - strings are converted to integers with a stable hash
+    entropy = [rand_seed]
+    for key in keys:
+        if isinstance(key, str):
+            entropy.append(zlib.crc32(key.encode('utf-8')))
+        else:
+            entropy.append(int(key))
+
+    return np.random.default_rng(entropy)
+
 
 def get_tuneup_targets(scenario):
 
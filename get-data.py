@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 
+import argparse
+import glob
 import numpy as np
 import os
 import pandas as pd
+import re
 import matplotlib.pyplot as plt
 plt.rcParams.update({'mathtext.default': 'regular'})
 from config import *
-np.random.seed(0)
+from tables import *
 
 
 if not os.path.isdir('plots'):
@@ -17,8 +20,13 @@ png_res = 300 # dpi
 
 def main():
 
-    bench = get_benchmarking_data()
-    arch = get_architecture_2030_data()
+    parser = argparse.ArgumentParser(description='extract, clean, and combine data')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for buildings data')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='number of rows of raw data to read at a time')
+    args = parser.parse_args()
+
+    bench = get_benchmarking_data(args.chunk_size)
+    arch = get_architecture_2030_data(args.chunk_size)
 
     # fill in arch energy data by sampling from bench energy data
     # - assume arch buildings use only elec and gas (not steam)
@@ -28,25 +36,26 @@ def main():
     # - get probabilities of sampling from each bin from histogram
     # - interpolate to fill in histogram bins with zero counts
     # - sample uniformly within each bin
+    # - sample all buildings at once (in order of arch data), so results do not depend on order of types
     num_bins = 25
     bench['site'] = bench['elec'] + bench['gas'] + bench['steam']
     bench['site eui'] = bench['site'] / bench['area']
     bench['elec/site'] = bench['elec'] / bench['site']
-    for typ in set(arch['type']):
-        aidx = arch['type'] == typ
-        bidx = bench['type'] == typ
-        for val in ['site eui','elec/site']:
-            if val == 'site eui':
-                bins = num_bins
-            elif val == 'elec/site':
-                bins = np.linspace(0, 1, num_bins)
+    arch_types = sorted(set(arch['type']))
+    type_rows = np.searchsorted(arch_types, arch['type'].to_numpy())
+    rng = get_rng('arch')
+    for val in ['site eui','elec/site']:
+        probs = np.zeros((len(arch_types), num_bins))
+        edges = np.zeros((len(arch_types), num_bins+1))
+        for i in range(len(arch_types)):
+            typ = arch_types[i]
+            bidx = bench['type'] == typ
             cnts, bins = np.histogram(bench.loc[bidx,val], bins=num_bins)
             plot_hist(cnts, bins, val, typ)
-            probs = np.interp(bins[:-1], bins[:-1][cnts != 0], cnts[cnts != 0])
-            probs /= np.sum(probs)
-            bin_idxs = np.random.choice(range(len(bins)-1), aidx.sum(), p=probs)
-            samples = map(lambda b: np.random.uniform(low=bins[b], high=bins[b+1]), bin_idxs)
-            arch.loc[aidx,val] = samples
+            probs[i] = np.interp(bins[:-1], bins[:-1][cnts != 0], cnts[cnts != 0])
+            probs[i] /= np.sum(probs[i])
+            edges[i] = bins
+        arch[val] = sample_bins(rng, type_rows, probs, edges)
     arch['site'] = arch['site eui'] * arch['area']
     arch['elec'] = arch['site'] * arch['elec/site']
     arch['gas'] = arch['site'] - arch['elec']
@@ -56,17 +65,54 @@ def main():
 
     data = pd.concat([bench,arch], sort=False, ignore_index=True)
 
-    data = data[['type','area','elec','gas','steam']]
+    # encode building type and floor area bin (positions in bldg_types and areas)
+    unknown_types = sorted(set(data['type']).difference(bldg_types))
+    if unknown_types:
+        print('found types not in bldg_types: %s' % ', '.join(unknown_types))
+    data['type code'] = get_type_codes(data['type'])
+    data['area code'] = get_area_codes(data['area'])
+
+    data = data[['type code','area code','area','elec','gas','steam']]
 
     for fuel in ['elec','gas','steam']:
         data.rename(columns={fuel: '2020 %s' % fuel}, inplace=True)
 
-    data.to_csv('buildings.csv', index=False)
+    write_table(data, 'buildings', args.format)
+
+
+def sample_bins(rng, rows, probs, edges):
+
+    # sample from histograms, for each item using histogram in its row of probs and edges
+    # - pick bins by searching cumulative probabilities, then sample uniformly within bins
+    # - offset cumulative probabilities in each row by row number, so one search covers all rows
+    num_bins = probs.shape[1]
+    cum_probs = np.cumsum(probs, axis=1)
+    cum_probs[:, -1] = 1.0
+    cum_probs += np.arange(len(probs))[:, np.newaxis]
+    bin_idxs = np.searchsorted(cum_probs.ravel(), rows + rng.random(len(rows)), side='right') - rows*num_bins
+    bin_idxs = np.minimum(bin_idxs, num_bins-1)
+
+    lows = edges[rows, bin_idxs]
+    highs = edges[rows, bin_idxs+1]
+
+    return lows + rng.random(len(rows)) * (highs - lows)
 
 
-def get_benchmarking_data():
+def get_benchmarking_data(chunk_size):
 
-    file_name = os.path.join('data','2018_Building_Energy_Benchmarking.csv')
+    # read benchmarking data for all years, in chunks
+    # - read latest year first, and only keep first row for each building id (so latest year that passes filters)
+    # - only keep cleaned rows and ids already kept, so memory does not grow with size of files
+    # - year is the four digits just before _Building_Energy_Benchmarking.csv (anything can come before it, e.g., Seattle_2018_)
+    file_years = {}
+    for file_name in glob.glob(os.path.join('data','*_Building_Energy_Benchmarking.csv')):
+        match = re.search(r'(\d{4})_Building_Energy_Benchmarking\.csv$', os.path.basename(file_name))
+        if match is None:
+            raise IOError('no year in name of benchmarking data %s (expected <year>_Building_Energy_Benchmarking.csv)' % file_name)
+        file_years[file_name] = int(match.group(1))
+    file_names = sorted(file_years.keys(), key=lambda f: file_years[f], reverse=True)
+    if not file_names:
+        raise IOError('no benchmarking data found in data')
 
     str_cols = {'OSEBuildingID': 'id'}
 
@@ -75,50 +121,66 @@ def get_benchmarking_data():
                 'NaturalGas(kBtu)': 'gas',
                 'SteamUse(kBtu)': 'steam'}
 
-    data = pd.read_csv(file_name, dtype=str).fillna('')
-    cols = num_cols.copy()
-    cols.update(str_cols)
-    data = data[cols.keys()]
-    data.rename(columns=cols, inplace=True)
+    prop_map = get_property_types()
 
-    # look up property types
+    kept_ids = set()
+    chunks = []
+    for file_name in file_names:
+        num_rows = 0
+        drops = {}
+        for data in read_csv_chunks(file_name, str_cols, num_cols, [''], chunk_size):
+            num_rows += len(data)
+            data = clean_benchmarking_data(data, prop_map, drops)
+            is_new = ~(data['id'].isin(kept_ids) | data['id'].duplicated())
+            data = drop_rows(data, is_new, 'building already read for same or later year', drops)
+            kept_ids.update(data['id'])
+            chunks.append(data.drop('id', axis='columns'))
+        report_rows(file_name, num_rows, drops)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def get_property_types():
+
+    # map from building id to property type
     prop_file = os.path.join('data','OSE Building ID vs Primary Property Type.csv')
-    prop_data = pd.read_csv(prop_file, dtype=str).fillna('')
+    prop_data = pd.read_csv(prop_file, dtype=str, usecols=['SeattleBuildingID','PrimaryPropertyType']).fillna('')
     prop_data.drop_duplicates(inplace=True)
-    prop_map = dict(zip(prop_data['SeattleBuildingID'], prop_data['PrimaryPropertyType']))
-    data['id'] = data['id'].apply(lambda i: i.replace(',',''))
-    data['type'] = data['id'].apply(lambda i: prop_map[i])
-    data = data.loc[data['type'] != '']
-    data.drop('id', axis='columns', inplace=True)
+    prop_map = pd.Series(prop_data['PrimaryPropertyType'].to_numpy(), index=prop_data['SeattleBuildingID'].to_numpy())
+    prop_map = prop_map[~prop_map.index.duplicated(keep='last')]
+
+    return prop_map
+
+
+def clean_benchmarking_data(data, prop_map, drops):
+
+    # look up property types
+    data['id'] = data['id'].str.replace(',', '', regex=False)
+    unknown_ids = ~data['id'].isin(prop_map.index)
+    if unknown_ids.any():
+        raise ValueError('no property type for %d buildings (e.g., id %s)' % (unknown_ids.sum(),data.loc[unknown_ids,'id'].iloc[0]))
+    data['type'] = data['id'].map(prop_map)
+    data = drop_rows(data, data['type'] != '', 'no property type', drops)
 
     # combine some types
     data.loc[data['type']=='College/University', 'type'] = 'University'
     data.loc[data['type']=='Refrigerated Warehouse', 'type'] = 'Warehouse'
     data.loc[data['type']=='Non-Refrigerated Warehouse', 'type'] = 'Warehouse'
 
-    def fix_num(x):
-        x = x.replace(',','')
-        if x == '':
-            x = 'nan'
-        x = float(x)
-        return x
-    for col in num_cols.values():
-        data[col] = data[col].apply(fix_num)
-        data = data.loc[data[col].notnull()]
+    for col in ['area','elec','gas','steam']:
+        data = drop_rows(data, data[col].notnull(), 'no %s' % col, drops)
 
     # only keep buildings with area above cutoff
-    data = data.loc[data['area'] >= 20e3]
+    data = drop_rows(data, data['area'] >= 20e3, 'area below 20k ft2', drops)
 
     # drop buildings with high or low site eui
-    data['site'] = data['elec'] + data['gas'] + data['steam']
-    data['site eui'] = data['site'] / data['area']
-    data = data.loc[(data['site eui'] >= 1.0) & (data['site eui'] <= 1000.0)]
-    data.drop(['site','site eui'], axis='columns', inplace=True)
+    site_eui = (data['elec'] + data['gas'] + data['steam']) / data['area']
+    data = drop_rows(data, (site_eui >= 1.0) & (site_eui <= 1000.0), 'site eui below 1 or above 1000 kBtu/ft2', drops)
 
     return data
 
 
-def get_architecture_2030_data():
+def get_architecture_2030_data(chunk_size):
 
     file_name = os.path.join('data', 'Architecture 2030 Report Data - AK_All Properties.csv')
 
@@ -127,216 +189,265 @@ def get_architecture_2030_data():
 
     num_cols = {'Total Floor Area (ft2)': 'area'}
 
-    data = pd.read_csv(file_name, dtype=str).fillna('')
-    cols = num_cols.copy()
-    cols.update(str_cols)
-    data = data[cols.keys()]
-    data.rename(columns=cols, inplace=True)
+    num_rows = 0
+    drops = {}
+    chunks = []
+    for data in read_csv_chunks(file_name, str_cols, num_cols, ['','-'], chunk_size, padded=True):
+        num_rows += len(data)
+        chunks.append(clean_architecture_2030_data(data, drops))
+    report_rows(file_name, num_rows, drops)
+
+    return pd.concat(chunks, ignore_index=True)
+
+
+def clean_architecture_2030_data(data, drops):
 
     # map types to same categories as in benchmarking data, exclude some types
-    data['city type'] = data['city type'].apply(lambda x: x.strip())
-    data['type'] = data['city type'] + '_' + data['eco type']
+    # - map each distinct type once (as categories), instead of each row
+    types = (data['city type'].str.strip() + '_' + data['eco type']).astype('category')
+    unknown_types = sorted(set(types.cat.categories).difference(arch_type_map.keys()))
+    if unknown_types:
+        raise ValueError('no mapping for arch types: %s' % ', '.join(unknown_types))
+    data['type'] = np.array([arch_type_map[typ] for typ in types.cat.categories], dtype=object)[types.cat.codes]
     data.drop(['city type','eco type'], axis='columns', inplace=True)
-    data['type'] = data['type'].apply(map_arch_type)
-    data = data.loc[data['type'] != '']
-
-    def fix_num(x):
-        x = x.replace(',','').strip()
-        if x in ['','-']:
-            x = 'nan'
-        x = float(x)
-        return x
-    for col in num_cols.values():
-        data[col] = data[col].apply(fix_num)
-        data = data.loc[data[col].notnull()]
+    data = drop_rows(data, data['type'] != '', 'type excluded', drops)
+
+    data = drop_rows(data, data['area'].notnull(), 'no area', drops)
 
     # remove bad data
-    data = data.loc[data['area'] >= 500.0]
+    data = drop_rows(data, data['area'] >= 500.0, 'area below 500 ft2', drops)
 
     # only keep buildings with area below cutoff
-    data = data.loc[data['area'] < 20e3]
+    data = drop_rows(data, data['area'] < 20e3, 'area above 20k ft2', drops)
 
     return data
 
 
-def map_arch_type(typ):
-
-    typ_map = {'ARCADE (573)_Other Commercial': 'Other',
-               'AUDITORIUM (302)_Other Commercial': 'Other',
-               'AUTO DEALERSHIP, COMPLETE (455)_Other Commercial': 'Other',
-               'AUTOMOBILE SHOWROOM (303)_Other Commercial': 'Other',
-               'AUTOMOTIVE CENTER (410)_Other Commercial': 'Other',
-               'Administrative Office (600)_Office': 'Small- and Mid-Sized Office',
-               'Art Gallery/Museum/Soc Srvc_Other Commercial': 'Other',
-               'BANK (304)_Office': 'Small- and Mid-Sized Office',
-               'BAR/TAVERN (442)_Restaurant': 'Restaurant',
-               'BARBER SHOP (384)_Other Commercial': 'Other',
-               'BARN (305)_Other Commercial': 'Other',
-               'BASEMENT, FINISHED (701)_Other Commercial': 'Other',
-               'BASEMENT, OFFICE (705)_Office': 'Small- and Mid-Sized Office',
-               'BASEMENT, PARKING (706)_Omit': '',
-               'BASEMENT, STORAGE (708)_Warehouse': 'Warehouse',
-               'BASEMENT, UNFINISHED (703)_Omit': '',
-               'BOWLING ALLEY (306)_Other Commercial': 'Other',
-               'BROADCAST FACILITIES (498)_Other Commercial': 'Other',
-               'Banquet Hall (718)_Other Commercial': 'Other',
-               'Bed & Breakfast_Hotel Motel': 'Hotel',
-               'CAFETERIA (530)_Restaurant': 'Restaurant',
-               'CHURCH WITH SUNDAY SCHOOL (308)_Other Commercial': 'Worship Facility',
-               'CLUBHOUSE (311)_Other Commercial': 'Other',
-               'COCKTAIL LOUNGE (441)_Restaurant': 'Restaurant',
-               'COLD STORAGE FACILITIES (447)_Other Commercial': 'Other',
-               'COLLEGE (ENTIRE) (377)_University': 'University',
-               'COMMUNITY SHOPPING CENTER (413)_Dry Goods Retail': 'Retail Store',
-               'COMPUTER CENTER (497)_Other Commercial': 'Other',
-               'CONDO HOTEL, LIMITED SERVICE (853)_Hotel Motel': 'Hotel',
-               'CONDO, OFFICE (845)_Office': 'Small- and Mid-Sized Office',
-               'CONDO, PARKING STRUCTURE (850)_Omit': '',
-               'CONDO, RETAIL (846)_Dry Goods Retail': 'Retail Store',
-               'CONVALESCENT HOSPITAL (313)_Hospital': 'Hospital',
-               'CONVENIENCE MARKET (419)_Dry Goods Retail': 'Supermarket / Grocery Store',
-               'CONVENTION CENTER (482)_Other Commercial': 'Other',
-               'COUNTRY CLUB (314)_Other Commercial': 'Other',
-               'Campground_Omit': '',
-               'Car Wash - Automatic (436)_Other Commercial': 'Other',
-               'Car Wash - Drive Thru (435)_Other Commercial': 'Other',
-               'Car Wash - Self Serve (434)_Other Commercial': 'Other',
-               'Casino (515)_Other Commercial': 'Other',
-               'Classroom (356)_School': 'K-12 School',
-               'Classroom (College) (368)_University': 'University',
-               'Commons (College) (369)_University': 'University',
-               'Community Center (514)_Other Commercial': 'Other',
-               'DAY CARE CENTER (426)_School': 'K-12 School',
-               'DENTAL OFFICE/CLINIC (444)_Office': 'Medical Office',
-               'DEPARTMENT STORE (318)_Dry Goods Retail': 'Retail Store',
-               'DISCOUNT STORE (319)_Dry Goods Retail': 'Retail Store',
-               'DORMITORY (321)_Multifamily': 'Residence Hall',
-               'Drug Store (511)_Dry Goods Retail': 'Retail Store',
-               'Dry Cleaners-Laundry (499)_Other Commercial': 'Other',
-               'ELEMENTARY SCHOOL (ENTIRE) (365)_School': 'K-12 School',
-               'EQUIPMENT (SHOP) BUILDING (470)_Warehouse': 'Warehouse',
-               'EQUIPMENT SHED (472)_Warehouse': 'Warehouse',
-               'Easement_Omit': '',
-               'FAST FOOD RESTAURANT (349)_Restaurant': 'Restaurant',
-               'FIELD HOUSES (486)_Other Commercial': 'Other',
-               'FIRE STATION (STAFFED) (322)_Other Commercial': 'Other',
-               'FIRE STATION (VOLUNTEER) (427)_Other Commercial': 'Other',
-               'FITNESS CENTER (483)_Other Commercial': 'Other',
-               'FLORIST SHOP (532)_Dry Goods Retail': 'Retail Store',
-               'Fine Arts & Crafts Building (355)_University': 'University',
-               'Forest Land(Class-RCW 84.33)_Omit': '',
-               'Fraternity/Sorority House_Multifamily': 'Residence Hall',
-               'GARAGE, SERVICE REPAIR (528)_Other Commercial': 'Other',
-               'GOVERNMENT COMMUNITY SERVICE BUILDING (491)_Office': 'Small- and Mid-Sized Office',
-               'GROUP CARE HOME (424)_Multifamily': 'Senior Care Community',
-               'Gas Station_Other Commercial': 'Other',
-               'Greenhouse, Hoop, Arch-Rib, Small (135)_Other Commercial': 'Other',
-               'Gymnasium (School) (358)_School': 'K-12 School',
-               'HANDBALL-RACQUETBALL CLUB (417)_Other Commercial': 'Other',
-               'HANGAR, MAINTENANCE & OFFICE (329)_Office': 'Small- and Mid-Sized Office',
-               'HEALTH CLUB (418)_Other Commercial': 'Other',
-               'HIGH SCHOOL (ENTIRE) (484)_School': 'K-12 School',
-               'HOTEL, FULL SERVICE (841)_Hotel Motel': 'Hotel',
-               'HOTEL, SUITE (842)_Hotel Motel': 'Hotel',
-               'Hospital_Hospital': 'Hospital',
-               'Hotel, Full Service (594)_Hotel Motel': 'Hotel',
-               'Hotel, Limited Service (595)_Hotel Motel': 'Hotel',
-               'INDUSTRIAL ENGINEERING BUILDING (392)_Other Commercial': 'Other',
-               'INDUSTRIAL FLEX BUILDINGS (453)_Other Commercial': 'Other',
-               'INDUSTRIAL HEAVY MANUFACTURING (495)_Other Commercial': 'Other',
-               'INDUSTRIAL LIGHT MANUFACTURING (494)_Other Commercial': 'Other',
-               'JAIL - POLICE STATION (489)_Other Commercial': 'Other',
-               'JUNIOR HIGH SCHOOL (ENTIRE) (366)_School': 'K-12 School',
-               'KENNELS (490)_Other Commercial': 'Other',
-               'LABORATORIES (496)_Hospital': 'Laboratory',
-               'LIGHT COMMERCIAL UTILITY BUILDING (471)_Other Commercial': 'Other',
-               'LINE RETAIL (860)_Dry Goods Retail': 'Retail Store',
-               'LOFT (338)_Multifamily': 'Low-Rise Multifamily',
-               'Lodge (537)_Hotel Motel': 'Hotel',
-               'MATERIAL STORAGE BUILDING (391)_Warehouse': 'Warehouse',
-               'MINI WAREHOUSE, HI-RISE (525)_Warehouse': 'Self-Storage Facility',
-               'MINI-LUBE GARAGE (423)_Other Commercial': 'Other',
-               'MINI-MART CONVENIENCE STORE (531)_Grocery': 'Supermarket / Grocery Store',
-               'MINI-WAREHOUSE (386)_Warehouse': 'Self-Storage Facility',
-               'MIXED RETAIL W/RES. UNITS (459)_Multifamily': 'Mixed Use Property',
-               'MIXED USE OFFICE (840)_Office': 'Small- and Mid-Sized Office',
-               'MIXED USE RETAIL (830)_Dry Goods Retail': 'Retail Store',
-               'MIXED USE-OFFICE CONDO (847)_Office': 'Small- and Mid-Sized Office',
-               'MIXED USE-RETAIL CONDO (848)_Office': 'Small- and Mid-Sized Office',
-               'MOTEL, FULL SERVICE (843)_Hotel Motel': 'Hotel',
-               'MOTEL, SUITE (844)_Hotel Motel': 'Hotel',
-               'MULTIPLE RESIDENCE (LOW RISE) (352)_Multifamily': 'Low-Rise Multifamily',
-               'MULTIPLE RESIDENCE (SENIOR CITIZEN) (451)_Multifamily': 'Senior Care Community',
-               'MULTIPLE RESIDENCE, RETIREMENT COMMUNITY COMPLEX_Multifamily': 'Senior Care Community',
-               'MULTIPLE RESIDENCES ASSISTED LIVING (LOW RISE)_Multifamily': 'Senior Care Community',
-               'MUNICIPAL SERVICE GARAGE (527)_Other Commercial': 'Other',
-               'MUSEUM (481)_Other Commercial': 'Other',
-               'Material Shelter (473)_Warehouse': 'Warehouse',
-               'Mixed Retail w/ Office Units (597)_Office': 'Small- and Mid-Sized Office',
-               'Multifamily_Multifamily': 'Low-Rise Multifamily',
-               'NATATORIUM (485)_Other Commercial': 'Other',
-               'NEIGHBORHOOD SHOPPING CENTER (412)_Dry Goods Retail': 'Retail Store',
-               'OFFICE BUILDING (344)_Office': 'Small- and Mid-Sized Office',
-               'OPEN OFFICE (820)_Office': 'Small- and Mid-Sized Office',
-               'Open Space Tmbr Land/Greenbelt_Omit': '',
-               'Open Space(Agric-RCW 84.34)_Omit': '',
-               'Open Space(Curr Use-RCW 84.34)_Omit': '',
-               'PARKING STRUCTURE (345)_Omit': '',
-               'POST OFFICE - BRANCH(582)_Other Commercial': 'Other',
-               'POST OFFICE - MAIL PROCESSING(583)_Other Commercial': 'Other',
-               'POST OFFICE - MAIN(581)_Other Commercial': 'Other',
-               'Passenger Terminal (571)_Other Commercial': 'Other',
-               'REGIONAL SHOPPING CENTER (414)_Dry Goods Retail': 'Retail Store',
-               'RESTAURANT, TABLE SERVICE (350)_Restaurant': 'Restaurant',
-               'RESTROOM BUILDING (432)_Other Commercial': 'Other',
-               'RETAIL STORE (353)_Dry Goods Retail': 'Retail Store',
-               'ROOMING HOUSE (551)_Hotel Motel': 'Hotel',
-               'Reforestation(RCW 84.28)_Omit': '',
-               'Reserve/Wilderness Area_Omit': '',
-               'Residence (348)_Single Family': '',
-               'Right of Way/Utility, Road_Omit': '',
-               'Rooming House_Hotel Motel': 'Hotel',
-               'SHED, MATERIAL STORAGE (468)_Warehouse': 'Warehouse',
-               'SKATING RINK (405)_Other Commercial': 'Other',
-               'SNACK BAR (529)_Restaurant': 'Restaurant',
-               'STABLE (378)_Other Commercial': 'Other',
-               'STORAGE WAREHOUSE (406)_Warehouse': 'Warehouse',
-               'SUPERMARKET (446)_Grocery': 'Supermarket / Grocery Store',
-               'Senior Center (985)_Other Commercial': 'Senior Care Community',
-               'Service Garage Shed (526)_Other Commercial': 'Other',
-               'Service Station (408)_Other Commercial': 'Other',
-               'Service Station_Other Commercial': 'Other',
-               'Shell Structure_Warehouse': 'Warehouse',
-               'Shell, Apartment (596)_Multifamily': 'Low-Rise Multifamily',
-               'Shell, Industrial (454)_Other Commercial': 'Other',
-               'Shell, Multiple Residence (587)_Multifamily': 'Low-Rise Multifamily',
-               'Shell, Office (492)_Office': 'Small- and Mid-Sized Office',
-               'Single Family_Single Family': '',
-               'Single-Family Residence (351)_Single Family': '',
-               'Ski Area_Omit': '',
-               'Sport Facility_Other Commercial': 'Other',
-               'TENNIS CLUB, INDOOR (416)_Other Commercial': 'Other',
-               'THEATER, CINEMA (380)_Other Commercial': 'Other',
-               'THEATER, LIVE STAGE (379)_Other Commercial': 'Other',
-               'TRANSIT WAREHOUSE (387)_Warehouse': 'Warehouse',
-               'Tideland, 2nd Class_Omit': '',
-               'Transferable Dev Rights_Omit': '',
-               'UNDERGROUND PARKING STRUCTURE (388)_Omit': '',
-               'VETERINARY HOSPITAL (381)_Hospital': 'Hospital',
-               'VISITOR CENTER (574)_Other Commercial': 'Other',
-               'VOCATIONAL SCHOOLS (487)_School': 'K-12 School',
-               'Vacant(Commercial)_Omit': '',
-               'Vacant(Multi-family)_Omit': '',
-               'Vacant(Single-family)_Omit': '',
-               'WAREHOUSE DISCOUNT STORE (458)_Warehouse': 'Warehouse',
-               'WAREHOUSE FOOD STORE (533)_Grocery': 'Supermarket / Grocery Store',
-               'WAREHOUSE OFFICE (810)_Office': 'Small- and Mid-Sized Office',
-               'WAREHOUSE SHOWROOM STORE (534)_Dry Goods Retail': 'Retail Store',
-               'WAREHOUSE, DISTRIBUTION (407)_Warehouse': 'Warehouse',
-               'Water Body, Fresh_Omit': '',
-               '_Omit': ''}
-
-    return typ_map[typ]
+def read_csv_chunks(file_name, str_cols, num_cols, nan_strs, chunk_size, padded=False):
+
+    # read only needed columns (in chunks of rows), and rename them
+    # - parse numbers (with thousands separators) while reading, with nan for missing values in nan_strs
+    # - if numbers may be padded with spaces (e.g., " - " for missing values), read them as strings and parse them after stripping
+    # - round_trip parses numbers same as float()
+    # - strings are never missing (empty instead)
+    dtypes = dict((col, str) for col in str_cols.keys())
+    dtypes.update((col, str if padded else float) for col in num_cols.keys())
+    cols = num_cols.copy()
+    cols.update(str_cols)
+    with pd.read_csv(file_name, usecols=list(dtypes.keys()), dtype=dtypes, thousands=',', float_precision='round_trip',
+                     keep_default_na=False, na_values=dict((col, [] if padded else nan_strs) for col in num_cols.keys()), chunksize=chunk_size) as reader:
+        for data in reader:
+            data = data[cols.keys()]
+            data = data.rename(columns=cols)
+            if padded:
+                for col in num_cols.values():
+                    data[col] = parse_nums(data[col], nan_strs)
+            yield data
+
+
+def parse_nums(vals, nan_strs):
+
+    # parse numbers with thousands separators and padding (e.g., " 20,036 "), with nan for missing values in nan_strs
+    # - strip before checking for missing values, so padded values (e.g., " - ") are missing too
+    # - parse with float(), same as round_trip parsing of numbers in read_csv
+    vals = vals.str.replace(',', '', regex=False).str.strip()
+    vals = vals.where(~vals.isin(nan_strs), np.nan)
+
+    return vals.to_numpy(dtype=object).astype(float)
+
+
+def drop_rows(data, keep, reason, drops):
+
+    # only keep some rows, and count how many were dropped for each reason
+    drops[reason] = drops.get(reason, 0) + len(data) - keep.sum()
+
+    return data.loc[keep]
+
+
+def report_rows(file_name, num_rows, drops):
+
+    print('%s: %d rows' % (file_name,num_rows))
+    for reason in drops.keys():
+        if drops[reason]:
+            print('  dropped %d rows (%s)' % (drops[reason],reason))
+
+
+# map from arch types (city use type and ecotope use type) to types in benchmarking data
+# - empty string means type is excluded
+arch_type_map = {'ARCADE (573)_Other Commercial': 'Other',
+                 'AUDITORIUM (302)_Other Commercial': 'Other',
+                 'AUTO DEALERSHIP, COMPLETE (455)_Other Commercial': 'Other',
+                 'AUTOMOBILE SHOWROOM (303)_Other Commercial': 'Other',
+                 'AUTOMOTIVE CENTER (410)_Other Commercial': 'Other',
+                 'Administrative Office (600)_Office': 'Small- and Mid-Sized Office',
+                 'Art Gallery/Museum/Soc Srvc_Other Commercial': 'Other',
+                 'BANK (304)_Office': 'Small- and Mid-Sized Office',
+                 'BAR/TAVERN (442)_Restaurant': 'Restaurant',
+                 'BARBER SHOP (384)_Other Commercial': 'Other',
+                 'BARN (305)_Other Commercial': 'Other',
+                 'BASEMENT, FINISHED (701)_Other Commercial': 'Other',
+                 'BASEMENT, OFFICE (705)_Office': 'Small- and Mid-Sized Office',
+                 'BASEMENT, PARKING (706)_Omit': '',
+                 'BASEMENT, STORAGE (708)_Warehouse': 'Warehouse',
+                 'BASEMENT, UNFINISHED (703)_Omit': '',
+                 'BOWLING ALLEY (306)_Other Commercial': 'Other',
+                 'BROADCAST FACILITIES (498)_Other Commercial': 'Other',
+                 'Banquet Hall (718)_Other Commercial': 'Other',
+                 'Bed & Breakfast_Hotel Motel': 'Hotel',
+                 'CAFETERIA (530)_Restaurant': 'Restaurant',
+                 'CHURCH WITH SUNDAY SCHOOL (308)_Other Commercial': 'Worship Facility',
+                 'CLUBHOUSE (311)_Other Commercial': 'Other',
+                 'COCKTAIL LOUNGE (441)_Restaurant': 'Restaurant',
+                 'COLD STORAGE FACILITIES (447)_Other Commercial': 'Other',
+                 'COLLEGE (ENTIRE) (377)_University': 'University',
+                 'COMMUNITY SHOPPING CENTER (413)_Dry Goods Retail': 'Retail Store',
+                 'COMPUTER CENTER (497)_Other Commercial': 'Other',
+                 'CONDO HOTEL, LIMITED SERVICE (853)_Hotel Motel': 'Hotel',
+                 'CONDO, OFFICE (845)_Office': 'Small- and Mid-Sized Office',
+                 'CONDO, PARKING STRUCTURE (850)_Omit': '',
+                 'CONDO, RETAIL (846)_Dry Goods Retail': 'Retail Store',
+                 'CONVALESCENT HOSPITAL (313)_Hospital': 'Hospital',
+                 'CONVENIENCE MARKET (419)_Dry Goods Retail': 'Supermarket / Grocery Store',
+                 'CONVENTION CENTER (482)_Other Commercial': 'Other',
+                 'COUNTRY CLUB (314)_Other Commercial': 'Other',
+                 'Campground_Omit': '',
+                 'Car Wash - Automatic (436)_Other Commercial': 'Other',
+                 'Car Wash - Drive Thru (435)_Other Commercial': 'Other',
+                 'Car Wash - Self Serve (434)_Other Commercial': 'Other',
+                 'Casino (515)_Other Commercial': 'Other',
+                 'Classroom (356)_School': 'K-12 School',
+                 'Classroom (College) (368)_University': 'University',
+                 'Commons (College) (369)_University': 'University',
+                 'Community Center (514)_Other Commercial': 'Other',
+                 'DAY CARE CENTER (426)_School': 'K-12 School',
+                 'DENTAL OFFICE/CLINIC (444)_Office': 'Medical Office',
+                 'DEPARTMENT STORE (318)_Dry Goods Retail': 'Retail Store',
+                 'DISCOUNT STORE (319)_Dry Goods Retail': 'Retail Store',
+                 'DORMITORY (321)_Multifamily': 'Residence Hall',
+                 'Drug Store (511)_Dry Goods Retail': 'Retail Store',
+                 'Dry Cleaners-Laundry (499)_Other Commercial': 'Other',
+                 'ELEMENTARY SCHOOL (ENTIRE) (365)_School': 'K-12 School',
+                 'EQUIPMENT (SHOP) BUILDING (470)_Warehouse': 'Warehouse',
+                 'EQUIPMENT SHED (472)_Warehouse': 'Warehouse',
+                 'Easement_Omit': '',
+                 'FAST FOOD RESTAURANT (349)_Restaurant': 'Restaurant',
+                 'FIELD HOUSES (486)_Other Commercial': 'Other',
+                 'FIRE STATION (STAFFED) (322)_Other Commercial': 'Other',
+                 'FIRE STATION (VOLUNTEER) (427)_Other Commercial': 'Other',
+                 'FITNESS CENTER (483)_Other Commercial': 'Other',
+                 'FLORIST SHOP (532)_Dry Goods Retail': 'Retail Store',
+                 'Fine Arts & Crafts Building (355)_University': 'University',
+                 'Forest Land(Class-RCW 84.33)_Omit': '',
+                 'Fraternity/Sorority House_Multifamily': 'Residence Hall',
+                 'GARAGE, SERVICE REPAIR (528)_Other Commercial': 'Other',
+                 'GOVERNMENT COMMUNITY SERVICE BUILDING (491)_Office': 'Small- and Mid-Sized Office',
+                 'GROUP CARE HOME (424)_Multifamily': 'Senior Care Community',
+                 'Gas Station_Other Commercial': 'Other',
+                 'Greenhouse, Hoop, Arch-Rib, Small (135)_Other Commercial': 'Other',
+                 'Gymnasium (School) (358)_School': 'K-12 School',
+                 'HANDBALL-RACQUETBALL CLUB (417)_Other Commercial': 'Other',
+                 'HANGAR, MAINTENANCE & OFFICE (329)_Office': 'Small- and Mid-Sized Office',
+                 'HEALTH CLUB (418)_Other Commercial': 'Other',
+                 'HIGH SCHOOL (ENTIRE) (484)_School': 'K-12 School',
+                 'HOTEL, FULL SERVICE (841)_Hotel Motel': 'Hotel',
+                 'HOTEL, SUITE (842)_Hotel Motel': 'Hotel',
+                 'Hospital_Hospital': 'Hospital',
+                 'Hotel, Full Service (594)_Hotel Motel': 'Hotel',
+                 'Hotel, Limited Service (595)_Hotel Motel': 'Hotel',
+                 'INDUSTRIAL ENGINEERING BUILDING (392)_Other Commercial': 'Other',
+                 'INDUSTRIAL FLEX BUILDINGS (453)_Other Commercial': 'Other',
+                 'INDUSTRIAL HEAVY MANUFACTURING (495)_Other Commercial': 'Other',
+                 'INDUSTRIAL LIGHT MANUFACTURING (494)_Other Commercial': 'Other',
+                 'JAIL - POLICE STATION (489)_Other Commercial': 'Other',
+                 'JUNIOR HIGH SCHOOL (ENTIRE) (366)_School': 'K-12 School',
+                 'KENNELS (490)_Other Commercial': 'Other',
+                 'LABORATORIES (496)_Hospital': 'Laboratory',
+                 'LIGHT COMMERCIAL UTILITY BUILDING (471)_Other Commercial': 'Other',
+                 'LINE RETAIL (860)_Dry Goods Retail': 'Retail Store',
+                 'LOFT (338)_Multifamily': 'Low-Rise Multifamily',
+                 'Lodge (537)_Hotel Motel': 'Hotel',
+                 'MATERIAL STORAGE BUILDING (391)_Warehouse': 'Warehouse',
+                 'MINI WAREHOUSE, HI-RISE (525)_Warehouse': 'Self-Storage Facility',
+                 'MINI-LUBE GARAGE (423)_Other Commercial': 'Other',
+                 'MINI-MART CONVENIENCE STORE (531)_Grocery': 'Supermarket / Grocery Store',
+                 'MINI-WAREHOUSE (386)_Warehouse': 'Self-Storage Facility',
+                 'MIXED RETAIL W/RES. UNITS (459)_Multifamily': 'Mixed Use Property',
+                 'MIXED USE OFFICE (840)_Office': 'Small- and Mid-Sized Office',
+                 'MIXED USE RETAIL (830)_Dry Goods Retail': 'Retail Store',
+                 'MIXED USE-OFFICE CONDO (847)_Office': 'Small- and Mid-Sized Office',
+                 'MIXED USE-RETAIL CONDO (848)_Office': 'Small- and Mid-Sized Office',
+                 'MOTEL, FULL SERVICE (843)_Hotel Motel': 'Hotel',
+                 'MOTEL, SUITE (844)_Hotel Motel': 'Hotel',
+                 'MULTIPLE RESIDENCE (LOW RISE) (352)_Multifamily': 'Low-Rise Multifamily',
+                 'MULTIPLE RESIDENCE (SENIOR CITIZEN) (451)_Multifamily': 'Senior Care Community',
+                 'MULTIPLE RESIDENCE, RETIREMENT COMMUNITY COMPLEX_Multifamily': 'Senior Care Community',
+                 'MULTIPLE RESIDENCES ASSISTED LIVING (LOW RISE)_Multifamily': 'Senior Care Community',
+                 'MUNICIPAL SERVICE GARAGE (527)_Other Commercial': 'Other',
+                 'MUSEUM (481)_Other Commercial': 'Other',
+                 'Material Shelter (473)_Warehouse': 'Warehouse',
+                 'Mixed Retail w/ Office Units (597)_Office': 'Small- and Mid-Sized Office',
+                 'Multifamily_Multifamily': 'Low-Rise Multifamily',
+                 'NATATORIUM (485)_Other Commercial': 'Other',
+                 'NEIGHBORHOOD SHOPPING CENTER (412)_Dry Goods Retail': 'Retail Store',
+                 'OFFICE BUILDING (344)_Office': 'Small- and Mid-Sized Office',
+                 'OPEN OFFICE (820)_Office': 'Small- and Mid-Sized Office',
+                 'Open Space Tmbr Land/Greenbelt_Omit': '',
+                 'Open Space(Agric-RCW 84.34)_Omit': '',
+                 'Open Space(Curr Use-RCW 84.34)_Omit': '',
+                 'PARKING STRUCTURE (345)_Omit': '',
+                 'POST OFFICE - BRANCH(582)_Other Commercial': 'Other',
+                 'POST OFFICE - MAIL PROCESSING(583)_Other Commercial': 'Other',
+                 'POST OFFICE - MAIN(581)_Other Commercial': 'Other',
+                 'Passenger Terminal (571)_Other Commercial': 'Other',
+                 'REGIONAL SHOPPING CENTER (414)_Dry Goods Retail': 'Retail Store',
+                 'RESTAURANT, TABLE SERVICE (350)_Restaurant': 'Restaurant',
+                 'RESTROOM BUILDING (432)_Other Commercial': 'Other',
+                 'RETAIL STORE (353)_Dry Goods Retail': 'Retail Store',
+                 'ROOMING HOUSE (551)_Hotel Motel': 'Hotel',
+                 'Reforestation(RCW 84.28)_Omit': '',
+                 'Reserve/Wilderness Area_Omit': '',
+                 'Residence (348)_Single Family': '',
+                 'Right of Way/Utility, Road_Omit': '',
+                 'Rooming House_Hotel Motel': 'Hotel',
+                 'SHED, MATERIAL STORAGE (468)_Warehouse': 'Warehouse',
+                 'SKATING RINK (405)_Other Commercial': 'Other',
+                 'SNACK BAR (529)_Restaurant': 'Restaurant',
+                 'STABLE (378)_Other Commercial': 'Other',
+                 'STORAGE WAREHOUSE (406)_Warehouse': 'Warehouse',
+                 'SUPERMARKET (446)_Grocery': 'Supermarket / Grocery Store',
+                 'Senior Center (985)_Other Commercial': 'Senior Care Community',
+                 'Service Garage Shed (526)_Other Commercial': 'Other',
+                 'Service Station (408)_Other Commercial': 'Other',
+                 'Service Station_Other Commercial': 'Other',
+                 'Shell Structure_Warehouse': 'Warehouse',
+                 'Shell, Apartment (596)_Multifamily': 'Low-Rise Multifamily',
+                 'Shell, Industrial (454)_Other Commercial': 'Other',
+                 'Shell, Multiple Residence (587)_Multifamily': 'Low-Rise Multifamily',
+                 'Shell, Office (492)_Office': 'Small- and Mid-Sized Office',
+                 'Single Family_Single Family': '',
+                 'Single-Family Residence (351)_Single Family': '',
+                 'Ski Area_Omit': '',
+                 'Sport Facility_Other Commercial': 'Other',
+                 'TENNIS CLUB, INDOOR (416)_Other Commercial': 'Other',
+                 'THEATER, CINEMA (380)_Other Commercial': 'Other',
+                 'THEATER, LIVE STAGE (379)_Other Commercial': 'Other',
+                 'TRANSIT WAREHOUSE (387)_Warehouse': 'Warehouse',
+                 'Tideland, 2nd Class_Omit': '',
+                 'Transferable Dev Rights_Omit': '',
+                 'UNDERGROUND PARKING STRUCTURE (388)_Omit': '',
+                 'VETERINARY HOSPITAL (381)_Hospital': 'Hospital',
+                 'VISITOR CENTER (574)_Other Commercial': 'Other',
+                 'VOCATIONAL SCHOOLS (487)_School': 'K-12 School',
+                 'Vacant(Commercial)_Omit': '',
+                 'Vacant(Multi-family)_Omit': '',
+                 'Vacant(Single-family)_Omit': '',
+                 'WAREHOUSE DISCOUNT STORE (458)_Warehouse': 'Warehouse',
+                 'WAREHOUSE FOOD STORE (533)_Grocery': 'Supermarket / Grocery Store',
+                 'WAREHOUSE OFFICE (810)_Office': 'Small- and Mid-Sized Office',
+                 'WAREHOUSE SHOWROOM STORE (534)_Dry Goods Retail': 'Retail Store',
+                 'WAREHOUSE, DISTRIBUTION (407)_Warehouse': 'Warehouse',
+                 'Water Body, Fresh_Omit': '',
+                 '_Omit': ''}
 
 
 def plot_hist(cnts, bins, val, typ):
@@ -1,11 +1,19 @@
 #!/usr/bin/env python
 
+import argparse
+import hashlib
+import inspect
+import json
+import matplotlib
+matplotlib.rcParams.update({'mathtext.default': 'regular'})
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import multiprocessing
 import os
-import matplotlib.pyplot as plt
-plt.rcParams.update({'mathtext.default': 'regular'})
 import numpy as np
-import pandas as pd
 from config import *
+from summary import *
+from tables import *
 
 
 if not os.path.isdir('plots'):
@@ -13,6 +21,7 @@ if not os.path.isdir('plots'):
 
 png_res = 300 # dpi
 alpha = 0.5
+band_alpha = 0.2
 
 num_types = 7
 
@@ -40,36 +49,139 @@ colors = ['red',
           'tan']
 assert len(colors)==len(bldg_types)
 
+# families of plots that can be selected with --only
+plot_families = ['by-policy','by-type','by-area','by-scenario','bars','histograms']
+
+# hashes of jobs for plots that have been rendered
+# - plots are only rendered again if their job hash changes (or the file is missing)
+manifest_file = os.path.join('plots','manifest.json')
+
+# sums of results by building type and floor area for each scenario
+summaries = {}
+
+# totals for replicates of each scenario (none if run-model.py was not run with --replicates)
+ensembles = {}
+
+
 def main():
 
-    all_data = {}
+    parser = argparse.ArgumentParser(description='plot model results')
+    parser.add_argument('--jobs', type=int, default=1, help='number of plots to render in parallel')
+    parser.add_argument('--only', nargs='+', choices=plot_families, default=plot_families, help='families of plots to make')
+    parser.add_argument('--force', action='store_true', help='render plots even if they have not changed')
+    args = parser.parse_args()
+
+    manifest = read_manifest()
+
+    # skip plots whose job is the same as when they were last rendered
+    hashes = {}
+    jobs = []
+    for job in get_jobs(args.only):
+        hashes[job['file']] = job_hash(job)
+        if args.force or manifest.get(job['file']) != hashes[job['file']] or not os.path.isfile(os.path.join('plots',job['file'])):
+            jobs.append(job)
+    print('rendering %d of %d plots' % (len(jobs),len(hashes)))
+
+    if args.jobs == 1:
+        for job in jobs:
+            manifest[render(job)] = hashes[job['file']]
+        write_manifest(manifest)
+
+    # render plots in a pool of worker processes
+    # - jobs hold everything needed to draw a plot, so workers do not read results
+    else:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('fork')
+        else:
+            ctx = multiprocessing.get_context()
+        with ctx.Pool(args.jobs) as pool:
+            for file_name in pool.imap_unordered(render, jobs):
+                manifest[file_name] = hashes[file_name]
+        write_manifest(manifest)
+
+
+def job_hash(job):
+
+    # hash everything that changes how plot looks: plotted values, labels, style, and code that draws it
+    content = {'job': job,
+               'style': [png_res, alpha, band_alpha, colors, matplotlib.__version__, matplotlib.rcParams['mathtext.default']],
+               'axes': [list(years), bldg_types, areas],
+               'code': [inspect.getsource(render), inspect.getsource(draw_funcs[job['kind']])]}
+    content = json.dumps(content, sort_keys=True, default=float)
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def read_manifest():
+
+    if os.path.isfile(manifest_file):
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    else:
+        return {}
+
+
+def write_manifest(manifest):
+
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def get_jobs(families):
+
+    # describe each plot in selected families as a job (plotted values and how to draw them)
+    jobs = []
+
     for scenario in scenarios:
-        scen_data = pd.read_csv(os.path.join('results','%s.csv' % scenario.replace(' ','-')))
-        all_data[scenario] = scen_data
 
-        quantity_by_policy(scen_data, scenario, 'energy')
-        quantity_by_policy(scen_data, scenario, 'emissions')
+        if 'by-policy' in families:
+            jobs.append(quantity_by_policy(scenario, 'energy'))
+            jobs.append(quantity_by_policy(scenario, 'emissions'))
 
-        quantity_by_type(scen_data, scenario, 'energy')
-        quantity_by_type(scen_data, scenario, 'emissions')
+        if 'by-type' in families:
+            jobs.append(quantity_by_type(scenario, 'energy'))
+            jobs.append(quantity_by_type(scenario, 'emissions'))
 
-        quantity_by_area(scen_data, scenario, 'energy')
-        quantity_by_area(scen_data, scenario, 'emissions')
+        if 'by-area' in families:
+            jobs.append(quantity_by_area(scenario, 'energy'))
+            jobs.append(quantity_by_area(scenario, 'emissions'))
 
-    for cumulative in [True,False]:
-        quantity_by_scenario(all_data, 'energy', cumulative)
-        quantity_by_scenario(all_data, 'emissions', cumulative)
+    if 'by-scenario' in families:
+        for cumulative in [True,False]:
+            jobs.extend(quantity_by_scenario('energy', cumulative))
+            jobs.extend(quantity_by_scenario('emissions', cumulative))
 
-    histogram_type(all_data[scenarios[0]])
-    quantity_type_bars(all_data[scenarios[0]], 'energy')
-    quantity_type_bars(all_data[scenarios[0]], 'emissions')
+    if 'histograms' in families:
+        jobs.append(histogram_type(scenarios[0]))
+    if 'bars' in families:
+        jobs.append(quantity_type_bars(scenarios[0], 'energy'))
+        jobs.append(quantity_type_bars(scenarios[0], 'emissions'))
 
-    histogram_area(all_data[scenarios[0]])
-    quantity_area_bars(all_data[scenarios[0]], 'energy')
-    quantity_area_bars(all_data[scenarios[0]], 'emissions')
+    if 'histograms' in families:
+        jobs.append(histogram_area(scenarios[0]))
+    if 'bars' in families:
+        jobs.append(quantity_area_bars(scenarios[0], 'energy'))
+        jobs.append(quantity_area_bars(scenarios[0], 'emissions'))
 
+    return jobs
 
-def quantity_by_policy(data, scenario, quantity):
+
+def render(job):
+
+    # draw plot on its own figure with the Agg canvas (no pyplot state, so safe in worker processes)
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    draw_funcs[job['kind']](ax, job)
+
+    fig.tight_layout()
+    fig.savefig(os.path.join('plots',job['file']), dpi=png_res)
+
+    return job['file']
+
+
+def get_weights(quantity):
 
     if quantity == 'energy':
         weights = {}
@@ -78,142 +190,187 @@ def quantity_by_policy(data, scenario, quantity):
     elif quantity == 'emissions':
         weights = ghg_factors
 
+    return weights
+
+
+def get_summary(scenario):
+
+    # read sums of results for scenario
+    # - if run-model.py did not write sums, compute them from results (only reading needed columns)
+    if scenario not in summaries:
+        name = os.path.join('results',scenario.replace(' ','-'))
+        if os.path.isfile('%s_summary.npz' % name):
+            summaries[scenario] = read_summary(name)
+        else:
+            summaries[scenario] = summarize_results(name)
+
+    return summaries[scenario]
+
+
+def get_ensemble(scenario):
+
+    # replicates from run-model.py --replicates, if any
+    # - run-model.py removes them when it writes results without --replicates, so they are never for older buildings data or targets than results
+    if scenario not in ensembles:
+        file_name = os.path.join('results','%s_ensemble.npz' % scenario.replace(' ','-'))
+        if os.path.isfile(file_name):
+            with np.load(file_name) as f:
+                ensembles[scenario] = {'percentiles': list(f['percentiles']), 'totals': f['totals']}
+        else:
+            ensembles[scenario] = None
+
+    return ensembles[scenario]
+
+
+def summarize_results(name):
+
+    en_cols = []
+    for year in years:
+        for fuel in fuels:
+            en_cols.append('%d %s' % (year,fuel))
+    reduct_cols = []
+    for year in years[1:]:
+        for policy in policies:
+            for fuel in fuels:
+                reduct_cols.append('%d %s %s reduct' % (year,policy,fuel))
+    data = read_table(name, ['type code','area code'] + en_cols)
+    reduct_data = sparse_to_frame(read_sparse_table('%s_reducts' % name), reduct_cols)
+
+    ens = data[en_cols].to_numpy().reshape((len(data), len(years), len(fuels)))
+    reducts = np.zeros((len(data), len(years), len(policies), len(fuels)))
+    reducts[:,1:] = reduct_data.to_numpy().reshape((len(data), len(years)-1, len(policies), len(fuels)))
+
+    return summarize(data['type code'].to_numpy(), data['area code'].to_numpy(), ens, reducts)
+
+
+def quantity_by_policy(scenario, quantity):
+
+    weights = get_weights(quantity)
+
+    summary = get_summary(scenario)
+
     init_val = 0.0
-    for fuel in fuels:
-        init_val += data['%d %s' % (years[0],fuel)].sum() * weights[fuel]
+    for f in range(len(fuels)):
+        init_val += summary['energy'][0,f].sum() * weights[fuels[f]]
 
-    values = {}
+    values = []
     for p in range(len(policies)):
         vals = [init_val]
         for y in range(1,len(years)):
             val = vals[y-1]
             for i in range(p+1):
-                for fuel in fuels:
-                    val -= data['%d %s %s reduct' % (years[y],policies[i],fuel)].sum() * weights[fuel]
+                for f in range(len(fuels)):
+                    val -= summary['reduct'][y,i,f].sum() * weights[fuels[f]]
             vals.append(val)
         vals = [100*val/init_val for val in vals]
-        values[policies[p]] = vals
+        values.append(vals)
 
-    fig, ax = plt.subplots()
+    job = {'kind': 'stacked',
+           'file': '%s-by-policy_%s.png' % (quantity,scenario.replace(' ','-')),
+           'quantity': quantity,
+           'values': values,
+           'labels': policy_labels,
+           'colors': colors[:len(policies)]}
 
-    ax.fill_between(years, values[policies[0]], 100, label=policy_labels[0], color=colors[0], alpha=alpha, linewidth=0)
-    for p in range(1,len(policies)):
-        ax.fill_between(years, values[policies[p]], values[policies[p-1]], label=policy_labels[p], color=colors[p], alpha=alpha, linewidth=0)
-    ax.fill_between(years, 0, values[policies[-1]], color='grey', alpha=alpha, linewidth=0)
+    return job
 
-    ax.yaxis.set_label_position('right')
-    ax.yaxis.tick_right()
-    ax.set_xlim(years[0], years[-1])
-    ax.set_ylim(0, 105)
-    ax.set_xticks(years)
-    ax.set_xticklabels([str(y) if (y%5==0) else '' for y in years])
-    ax.set_yticks(range(0,100+1,10))
-    ax.set_xlabel('year')
-    ax.set_ylabel('%s (%% of 2020)' % quantity)
-    ax.legend(loc='lower left', fontsize=12)
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','%s-by-policy_%s.png' % (quantity,scenario.replace(' ','-'))), dpi=png_res)
-    plt.close()
 
+def quantity_by_type(scenario, quantity):
 
-def quantity_by_type(data, scenario, quantity):
+    weights = get_weights(quantity)
 
-    if quantity == 'energy':
-        weights = {}
-        for fuel in fuels:
-            weights[fuel] = 1.0
-    elif quantity == 'emissions':
-        weights = ghg_factors
+    summary = get_summary(scenario)
 
     vals = []
-    for bldg_type in bldg_types:
-        idx = data['type'] == bldg_type
+    for t in range(len(bldg_types)):
         val = 0.0
-        for fuel in fuels:
-            val += data.loc[idx,'%d %s' % (years[0],fuel)].sum() * weights[fuel]
+        for f in range(len(fuels)):
+            val += summary['energy'][0,f,t].sum() * weights[fuels[f]]
         vals.append(val)
     types = [t for v,t in sorted(zip(vals,bldg_types), reverse=True)]
     types = types[:num_types]
-    tmp_data = data.copy()
-    for typ in set(tmp_data['type']):
-        if typ not in types:
-            tmp_data.loc[tmp_data['type']==typ, 'type'] = 'All Others Combined'
+
+    # group type codes, with all other types in last group
+    groups = np.full(len(bldg_types)+1, len(types))
+    for i in range(len(types)):
+        groups[bldg_types.index(types[i])] = i
+    type_colors = [colors[bldg_types.index(typ)] for typ in types] + [colors[-1]]
     types.append('All Others Combined')
 
     init_val = 0.0
-    for fuel in fuels:
-        init_val += tmp_data['%d %s' % (years[0],fuel)].sum() * weights[fuel]
-
-    values = {}
+    for f in range(len(fuels)):
+        init_val += summary['energy'][0,f].sum() * weights[fuels[f]]
+
+    # reductions by [year, group], summed over policies and areas
+    reducts = np.zeros((len(years), len(types)))
+    for f in range(len(fuels)):
+        type_reducts = summary['reduct'][:,:,f].sum(axis=(1,3))
+        for y in range(len(years)):
+            reducts[y] += np.bincount(groups, weights=type_reducts[y], minlength=len(types)) * weights[fuels[f]]
+
+    vals = stacked_values(init_val, reducts)
+    values = []
     for t in range(len(types)):
-        vals = [init_val]
-        for y in range(1,len(years)):
-            val = vals[y-1]
-            for i in range(t+1):
-                idx = tmp_data['type'] == types[i]
-                for fuel in fuels:
-                    for policy in policies:
-                        val -= tmp_data.loc[idx, '%d %s %s reduct' % (years[y],policy,fuel)].sum() * weights[fuel]
-            vals.append(val)
-        vals = [100*val/init_val for val in vals]
-        values[types[t]] = vals
+        values.append(list(vals[:,t]))
 
-    fig, ax = plt.subplots()
+    job = {'kind': 'stacked',
+           'file': '%s-by-type_%s.png' % (quantity,scenario.replace(' ','-')),
+           'quantity': quantity,
+           'values': values,
+           'labels': types,
+           'colors': type_colors}
 
-    ax.fill_between(years, values[types[0]], 100, label=types[0], color=colors[bldg_types.index(types[0])], alpha=alpha, linewidth=0)
-    for t in range(1,len(types)-1):
-        ax.fill_between(years, values[types[t]], values[types[t-1]], label=types[t], color=colors[bldg_types.index(types[t])], alpha=alpha, linewidth=0)
-    ax.fill_between(years, values[types[t+1]], values[types[t]], label=types[t+1], color=colors[-1], alpha=alpha, linewidth=0)
-    ax.fill_between(years, 0, values[types[-1]], color='grey', alpha=alpha, linewidth=0)
+    return job
 
-    ax.yaxis.set_label_position('right')
-    ax.yaxis.tick_right()
-    ax.set_xlim(years[0], years[-1])
-    ax.set_ylim(0, 105)
-    ax.set_xticks(years)
-    ax.set_xticklabels([str(y) if (y%5==0) else '' for y in years])
-    ax.set_yticks(range(0,100+1,10))
-    ax.set_xlabel('year')
-    ax.set_ylabel('%s (%% of 2020)' % quantity)
-    ax.legend(loc='lower left', fontsize=12)
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','%s-by-type_%s.png' % (quantity,scenario.replace(' ','-'))), dpi=png_res)
-    plt.close()
 
+def quantity_by_area(scenario, quantity):
 
-def quantity_by_area(data, scenario, quantity):
+    weights = get_weights(quantity)
 
-    if quantity == 'energy':
-        weights = {}
-        for fuel in fuels:
-            weights[fuel] = 1.0
-    elif quantity == 'emissions':
-        weights = ghg_factors
+    summary = get_summary(scenario)
 
     init_val = 0.0
-    for fuel in fuels:
-        init_val += data['%d %s' % (years[0],fuel)].sum() * weights[fuel]
+    for f in range(len(fuels)):
+        init_val += summary['energy'][0,f].sum() * weights[fuels[f]]
 
-    values = {}
+    # reductions by [year, area], summed over policies and types
+    reducts = np.zeros((len(years), len(areas)))
+    for f in range(len(fuels)):
+        reducts += summary['reduct'][:,:,f].sum(axis=(1,2)) * weights[fuels[f]]
+
+    vals = stacked_values(init_val, reducts)
+    values = []
     for a in range(len(areas)):
-        vals = [init_val]
-        for y in range(1,len(years)):
-            val = vals[y-1]
-            for i in range(a+1):
-                idx = (data['area'] >= areas[i][1]) & (data['area'] < areas[i][2])
-                for fuel in fuels:
-                    for policy in policies:
-                        val -= data.loc[idx, '%d %s %s reduct' % (years[y],policy,fuel)].sum() * weights[fuel]
-            vals.append(val)
-        vals = [100*val/init_val for val in vals]
-        values[areas[a][0]] = vals
+        values.append(list(vals[:,a]))
+
+    job = {'kind': 'stacked',
+           'file': '%s-by-area_%s.png' % (quantity,scenario.replace(' ','-')),
+           'quantity': quantity,
+           'values': values,
+           'labels': [area[0] for area in areas],
+           'colors': colors[:len(areas)]}
+
+    return job
+
+
+def stacked_values(init_val, reducts):
+
+    # percent of initial value left after reductions by [year, group] in each group and all groups before it
+    # - stack groups with cumulative sum over groups, then accumulate years with cumulative sum over years
+    # - reductions in first year are zero, so first year is initial value
+    vals = init_val - np.cumsum(np.cumsum(reducts, axis=1), axis=0)
+
+    return 100*vals/init_val
 
-    fig, ax = plt.subplots()
 
-    ax.fill_between(years, values[areas[0][0]], 100, label=areas[0][0], color=colors[0], alpha=alpha, linewidth=0)
-    for a in range(1,len(areas)):
-        ax.fill_between(years, values[areas[a][0]], values[areas[a-1][0]], label=areas[a][0], color=colors[a], alpha=alpha, linewidth=0)
-    ax.fill_between(years, 0, values[areas[-1][0]], color='grey', alpha=alpha, linewidth=0)
+def draw_stacked(ax, job):
+
+    # bands between each stacked series and the one above it, with what is left in grey
+    values = job['values']
+    ax.fill_between(years, values[0], 100, label=job['labels'][0], color=job['colors'][0], alpha=alpha, linewidth=0)
+    for i in range(1,len(values)):
+        ax.fill_between(years, values[i], values[i-1], label=job['labels'][i], color=job['colors'][i], alpha=alpha, linewidth=0)
+    ax.fill_between(years, 0, values[-1], color='grey', alpha=alpha, linewidth=0)
 
     ax.yaxis.set_label_position('right')
     ax.yaxis.tick_right()
@@ -223,14 +380,11 @@ def quantity_by_area(data, scenario, quantity):
     ax.set_xticklabels([str(y) if (y%5==0) else '' for y in years])
     ax.set_yticks(range(0,100+1,10))
     ax.set_xlabel('year')
-    ax.set_ylabel('%s (%% of 2020)' % quantity)
+    ax.set_ylabel('%s (%% of 2020)' % job['quantity'])
     ax.legend(loc='lower left', fontsize=12)
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','%s-by-area_%s.png' % (quantity,scenario.replace(' ','-'))), dpi=png_res)
-    plt.close()
 
 
-def quantity_by_scenario(all_data, quantity, cumulative):
+def quantity_by_scenario(quantity, cumulative):
 
     scens_dict = {'amount': {'Basecase': 'basecase',
                              'Phasing-Option A': 'nominal (20% from 2020)',
@@ -251,178 +405,195 @@ def quantity_by_scenario(all_data, quantity, cumulative):
                              'Phasing-Option H': 'restaurants exempt',
                              'Phasing-Option I': 'hospitals, hotels, and restaurants exempt'}}
 
+    jobs = []
     for scens_name in scens_dict.keys():
         scenarios = sorted(scens_dict[scens_name].keys())
 
-        if quantity == 'energy':
-            weights = {}
-            for fuel in fuels:
-                weights[fuel] = 1.0
-        elif quantity == 'emissions':
-            weights = ghg_factors
+        weights = get_weights(quantity)
 
         scenario = scenarios[0]
-        scen_data = all_data[scenario]
+        summary = get_summary(scenario)
         init_val = 0.0
-        for fuel in fuels:
-            init_val += scen_data['%d %s' % (years[0],fuel)].sum() * weights[fuel]
+        for f in range(len(fuels)):
+            init_val += summary['energy'][0,f].sum() * weights[fuels[f]]
 
         values = {}
+        bands = {}
         for scenario in scenarios:
-            scen_data = all_data[scenario]
+            summary = get_summary(scenario)
             vals = [init_val]
             for y in range(1,len(years)):
                 val = vals[y-1]
-                for fuel in fuels:
-                    val -= scen_data['%d %s reduct' % (years[y],fuel)].sum() * weights[fuel]
+                for f in range(len(fuels)):
+                    val -= summary['reduct'][y,:,f].sum() * weights[fuels[f]]
                 vals.append(val)
-            if cumulative:
-                vals = list(np.cumsum(vals))
-                for y in range(len(years)):
-                    vals[y] = init_val*(y+1) - vals[y]
-                    if quantity == 'energy':
-                        vals[y] /= 1.0e9 # kBtu to billion kBtu
-                    elif quantity == 'emissions':
-                        vals[y] /= 1.0e9 # kgCO2e to million MtCO2e
+            values[scenario] = scenario_values(vals, init_val, quantity, cumulative)
+
+            # band between lowest and highest percentiles of replicates (if run-model.py was run with --replicates)
+            ensemble = get_ensemble(scenario)
+            if ensemble is not None:
+                rep_vals = []
+                for r in range(len(ensemble['totals'])):
+                    vals = np.zeros(len(years))
+                    for f in range(len(fuels)):
+                        vals += ensemble['totals'][r,:,f] * weights[fuels[f]]
+                    rep_vals.append(scenario_values(list(vals), init_val, quantity, cumulative))
+                pcts = [ensemble['percentiles'][0], ensemble['percentiles'][-1]]
+                bands[scenario] = [list(band) for band in np.percentile(rep_vals, pcts, axis=0)]
             else:
-                vals = [100.0*val/init_val for val in vals]
-            values[scenario] = vals
-
-        labels = []
-        for s in range(len(scenarios)):
-            labels.append(scens_dict[scens_name][scenarios[s]])
-
-        fig, ax = plt.subplots()
-
-        for s in range(len(scenarios)):
-            ax.plot(years, values[scenarios[s]], label=labels[s], color=colors[s], linewidth=2)
-
-        ax.set_xlim(years[0], years[-1])
-        ax.set_xticks(years)
-        ax.set_xticklabels([str(y) if (y%5==0) else '' for y in years])
-        ax.set_xlabel('year')
-        ax.yaxis.set_label_position('right')
-        ax.yaxis.tick_right()
-        if not cumulative:
-            ax.set_ylim(0, 105)
-            ax.set_yticks(range(0,100+1,10))
+                bands[scenario] = None
+
+        job = {'kind': 'lines',
+               'values': [values[scenario] for scenario in scenarios],
+               'bands': [bands[scenario] for scenario in scenarios],
+               'labels': [scens_dict[scens_name][scenario] for scenario in scenarios],
+               'cumulative': cumulative}
         if cumulative:
             if quantity == 'energy':
                 units = 'billion kBtu'
             elif quantity == 'emissions':
                 units = 'million MtCO2e'
-            ax.set_ylabel('%s savings (%s)' % (quantity,units))
-            ax.legend(loc='upper left', fontsize=12)
-            plt.tight_layout()
-            plt.savefig(os.path.join('plots','%s-cumulative-savings-by-scenario-%s.png' % (quantity,scens_name)), dpi=png_res)
+            job['file'] = '%s-cumulative-savings-by-scenario-%s.png' % (quantity,scens_name)
+            job['ylabel'] = '%s savings (%s)' % (quantity,units)
         else:
-            ax.set_ylabel('%s (%% of 2020)' % quantity)
-            ax.legend(loc='lower left', fontsize=12)
-            plt.tight_layout()
-            plt.savefig(os.path.join('plots','%s-by-scenario-%s.png' % (quantity,scens_name)), dpi=png_res)
-        plt.close()
+            job['file'] = '%s-by-scenario-%s.png' % (quantity,scens_name)
+            job['ylabel'] = '%s (%% of 2020)' % quantity
+        jobs.append(job)
 
+    return jobs
 
-def histogram_type(data):
 
-    fig, ax = plt.subplots()
+def scenario_values(vals, init_val, quantity, cumulative):
 
-    for t in range(len(bldg_types)):
-        typ = bldg_types[t]
-        idx = data['type'] == typ
-        ax.barh(t, idx.sum() / float(len(idx)) * 100.0, align='center')
+    # convert energy use or emissions by year to cumulative savings or percent of initial value
+    if cumulative:
+        vals = list(np.cumsum(vals))
+        for y in range(len(years)):
+            vals[y] = init_val*(y+1) - vals[y]
+            if quantity == 'energy':
+                vals[y] /= 1.0e9 # kBtu to billion kBtu
+            elif quantity == 'emissions':
+                vals[y] /= 1.0e9 # kgCO2e to million MtCO2e
+    else:
+        vals = [100.0*val/init_val for val in vals]
 
-    ax.set_ylim(-0.5, len(bldg_types)-0.5)
-    ax.set_yticks(range(len(bldg_types)))
-    ax.set_yticklabels(bldg_types)
-    ax.set_ylabel('building type')
-    ax.set_xlabel('% of buildings')
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','type-histogram.png'), dpi=png_res)
-    plt.close()
+    return vals
 
 
-def histogram_area(data):
+def draw_lines(ax, job):
 
-    fig, ax = plt.subplots()
+    for s in range(len(job['values'])):
+        if job['bands'][s] is not None:
+            ax.fill_between(years, job['bands'][s][0], job['bands'][s][1], color=colors[s], alpha=band_alpha, linewidth=0)
+        ax.plot(years, job['values'][s], label=job['labels'][s], color=colors[s], linewidth=2)
 
-    area_labs = []
-    for a in range(len(areas)):
-        area_lab, area_min, area_max = areas[a]
-        area_labs.append(area_lab[:-len(' ft$^2$')])
-        idx = (data['area'] >= area_min) & (data['area'] < area_max)
-        ax.bar(a, idx.sum() / float(len(idx)) * 100.0, align='center')
+    ax.set_xlim(years[0], years[-1])
+    ax.set_xticks(years)
+    ax.set_xticklabels([str(y) if (y%5==0) else '' for y in years])
+    ax.set_xlabel('year')
+    ax.yaxis.set_label_position('right')
+    ax.yaxis.tick_right()
+    ax.set_ylabel(job['ylabel'])
+    if job['cumulative']:
+        ax.legend(loc='upper left', fontsize=12)
+    else:
+        ax.set_ylim(0, 105)
+        ax.set_yticks(range(0,100+1,10))
+        ax.legend(loc='lower left', fontsize=12)
 
-    ax.set_xlim(-0.5, len(areas)-0.5)
-    ax.set_xticks(range(len(areas)))
-    ax.set_xticklabels(area_labs)
-    ax.set_xlabel('floor area (ft$^2$)')
-    ax.set_ylabel('% of buildings')
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','area-histogram.png'), dpi=png_res)
-    plt.close()
 
+def histogram_type(scenario):
 
-def quantity_type_bars(data, quantity):
+    cnts = get_summary(scenario)['count'].sum(axis=1)
 
-    if quantity == 'energy':
-        weights = {}
-        for fuel in fuels:
-            weights[fuel] = 1.0
-    elif quantity == 'emissions':
-        weights = ghg_factors
+    job = {'kind': 'type bars',
+           'file': 'type-histogram.png',
+           'values': [cnts[t] / float(cnts.sum()) * 100.0 for t in range(len(bldg_types))],
+           'xlabel': '% of buildings'}
+
+    return job
+
+
+def histogram_area(scenario):
+
+    cnts = get_summary(scenario)['count'].sum(axis=0)
+
+    job = {'kind': 'area bars',
+           'file': 'area-histogram.png',
+           'values': [cnts[a] / float(cnts.sum()) * 100.0 for a in range(len(areas))],
+           'ylabel': '% of buildings'}
+
+    return job
+
+
+def quantity_type_bars(scenario, quantity):
+
+    weights = get_weights(quantity)
 
-    vals = pd.Series(index=data.index, data=0.0)
-    for fuel in fuels:
-        vals += data['%d %s' % (years[0],fuel)] * weights[fuel]
+    # energy use or emissions by [type, area]
+    summary = get_summary(scenario)
+    vals = np.zeros(summary_shape)
+    for f in range(len(fuels)):
+        vals += summary['energy'][0,f] * weights[fuels[f]]
 
-    fig, ax = plt.subplots()
+    job = {'kind': 'type bars',
+           'file': '%s-type-bars.png' % quantity,
+           'values': [vals[t].sum() / vals.sum() * 100.0 for t in range(len(bldg_types))],
+           'xlabel': '%s (%% of total)' % quantity}
+
+    return job
+
+
+def quantity_area_bars(scenario, quantity):
+
+    weights = get_weights(quantity)
+
+    # energy use or emissions by [type, area]
+    summary = get_summary(scenario)
+    vals = np.zeros(summary_shape)
+    for f in range(len(fuels)):
+        vals += summary['energy'][0,f] * weights[fuels[f]]
+
+    job = {'kind': 'area bars',
+           'file': '%s-area-bars.png' % quantity,
+           'values': [vals[:,a].sum() / vals.sum() * 100.0 for a in range(len(areas))],
+           'ylabel': '%s (%% of total)' % quantity}
+
+    return job
+
+
+def draw_type_bars(ax, job):
 
     for t in range(len(bldg_types)):
-        typ = bldg_types[t]
-        idx = data['type'] == typ
-        ax.barh(t, vals.loc[idx].sum() / vals.sum() * 100.0, align='center')
+        ax.barh(t, job['values'][t], align='center')
 
     ax.set_ylim(-0.5, len(bldg_types)-0.5)
     ax.set_yticks(range(len(bldg_types)))
     ax.set_yticklabels(bldg_types)
     ax.set_ylabel('building type')
-    ax.set_xlabel('%s (%% of total)' % quantity)
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','%s-type-bars.png' % quantity), dpi=png_res)
-    plt.close()
-
+    ax.set_xlabel(job['xlabel'])
 
-def quantity_area_bars(data, quantity):
 
-    if quantity == 'energy':
-        weights = {}
-        for fuel in fuels:
-            weights[fuel] = 1.0
-    elif quantity == 'emissions':
-        weights = ghg_factors
-
-    vals = pd.Series(index=data.index, data=0.0)
-    for fuel in fuels:
-        vals += data['%d %s' % (years[0],fuel)] * weights[fuel]
-
-    fig, ax = plt.subplots()
+def draw_area_bars(ax, job):
 
     area_labs = []
     for a in range(len(areas)):
         area_lab, area_min, area_max = areas[a]
         area_labs.append(area_lab[:-len(' ft$^2$')])
-        idx = (data['area'] >= area_min) & (data['area'] < area_max)
-        ax.bar(a, vals.loc[idx].sum() / vals.sum() * 100.0, align='center')
+        ax.bar(a, job['values'][a], align='center')
 
     ax.set_xlim(-0.5, len(areas)-0.5)
     ax.set_xticks(range(len(areas)))
     ax.set_xticklabels(area_labs)
     ax.set_xlabel('floor area (ft$^2$)')
-    ax.set_ylabel('%s (%% of total)' % quantity)
-    plt.tight_layout()
-    plt.savefig(os.path.join('plots','%s-area-bars.png' % quantity), dpi=png_res)
-    plt.close()
+    ax.set_ylabel(job['ylabel'])
+
+
+# functions that draw each kind of plot job
+draw_funcs = {'stacked': draw_stacked,
+              'lines': draw_lines,
+              'type bars': draw_type_bars,
+              'area bars': draw_area_bars}
 
 
 if __name__ == '__main__':
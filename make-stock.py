@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+from config import *
+from tables import *
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='make a synthetic building stock of any size from buildings data')
+    parser.add_argument('--size', type=int, required=True, help='number of buildings')
+    parser.add_argument('--source', default='buildings', help='table of buildings to sample from (default: buildings)')
+    parser.add_argument('--output', default='buildings', help='table to write (default: buildings, must not be source)')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for synthetic buildings')
+    args = parser.parse_args()
+
+    # never replace source (in any format), e.g., the real buildings data when run in the project directory with default names
+    if os.path.abspath(args.output) == os.path.abspath(args.source):
+        parser.error('output %s is the source table (give another --output, or a --source outside this directory)' % args.output)
+
+    data = read_table(args.source)
+    stock = make_stock(data, args.size)
+    write_table(stock, args.output, args.format)
+    print('%s: %d buildings' % (args.output,len(stock)))
+
+
+def make_stock(data, size):
+
+    # sample buildings with replacement, so stock has the same type mix and joint distribution of area and energy use
+    # - same size always gives same stock
+    rng = get_rng('stock', size)
+    idx = rng.integers(len(data), size=size)
+
+    return data.iloc[idx].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import subprocess
+import sys
+from config import *
+from tables import *
+
+
+# fingerprints of inputs to each stage when it was last run
+# - buildings: data files, get-data.py, and config it uses
+# - results <scenario>: buildings, run-model.py, config it uses, and targets for scenario
+# - plots: results of all scenarios and make-plots.py
+state_file = 'pipeline.json'
+
+# functions in config.py that give targets for each policy
+target_funcs = {'tuneup': get_tuneup_targets,
+                'eui': get_eui_targets,
+                'ghg': get_ghg_targets,
+                'electrify': get_electrify_targets}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='run get-data.py, run-model.py, and make-plots.py for whatever is out of date')
+    parser.add_argument('--jobs', type=int, default=1, help='number of scenarios or plots to run in parallel')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for buildings data and results')
+    parser.add_argument('--force', action='store_true', help='run all stages even if they are up to date')
+    args = parser.parse_args()
+
+    state = read_state()
+
+    # buildings
+    fingerprint = buildings_fingerprint(args.format)
+    if args.force or state.get('buildings') != fingerprint or not table_exists('buildings'):
+        run_script('get-data.py', ['--format',args.format])
+        state['buildings'] = fingerprint
+        write_state(state)
+    else:
+        print('buildings are up to date')
+
+    # results for each scenario
+    bldgs_hash = file_hash(find_table('buildings'))
+    fingerprints = {}
+    stale = []
+    for scenario in scenarios:
+        fingerprints[scenario] = results_fingerprint(scenario, bldgs_hash, args.format)
+        if args.force or state.get('results %s' % scenario) != fingerprints[scenario] or not results_exist(scenario):
+            stale.append(scenario)
+    if stale:
+        run_script('run-model.py', ['--jobs',str(args.jobs),'--format',args.format,'--scenarios'] + stale)
+        for scenario in stale:
+            state['results %s' % scenario] = fingerprints[scenario]
+        write_state(state)
+    else:
+        print('results are up to date')
+
+    # plots
+    # - make-plots.py only redraws plots whose data, style, or drawing code changed, so rerun scenarios only redraw their own plots
+    # - after changes to make-plots.py, it is run again and redraws whatever the change affects (not necessarily all plots)
+    fingerprint = get_fingerprint([fingerprints[scenario] for scenario in scenarios],
+                                  file_hash('make-plots.py'), file_hash('summary.py'), file_hash('tables.py'), file_hash('config.py'))
+    if args.force or state.get('plots') != fingerprint or not os.path.isfile(os.path.join('plots','manifest.json')):
+        run_script('make-plots.py', ['--jobs',str(args.jobs)] + (['--force'] if args.force else []))
+        state['plots'] = fingerprint
+        write_state(state)
+    else:
+        print('plots are up to date')
+
+
+def buildings_fingerprint(fmt):
+
+    data_files = sorted(os.listdir('data'))
+
+    return get_fingerprint(fmt,
+                           [(f, file_hash(os.path.join('data',f))) for f in data_files],
+                           file_hash('get-data.py'), file_hash('tables.py'),
+                           bldg_types, areas, rand_seed,
+                           inspect.getsource(get_type_codes), inspect.getsource(get_area_codes), inspect.getsource(get_rng))
+
+
+def results_fingerprint(scenario, bldgs_hash, fmt):
+
+    targets = {}
+    for policy in policies:
+        targets[policy] = target_funcs[policy](scenario)
+
+    return get_fingerprint(fmt, bldgs_hash,
+                           file_hash('run-model.py'), file_hash('summary.py'), file_hash('tables.py'),
+                           list(years), fuels, policies, bldg_types, areas, ghg_factors, rand_seed,
+                           inspect.getsource(get_rng), targets)
+
+
+def get_fingerprint(*inputs):
+
+    content = json.dumps(inputs, sort_keys=True, default=repr)
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def file_hash(file_name):
+
+    h = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def table_exists(name):
+
+    try:
+        find_table(name)
+    except IOError:
+        return False
+
+    return True
+
+
+def results_exist(scenario):
+
+    name = os.path.join('results',scenario.replace(' ','-'))
+
+    return table_exists(name) and table_exists('%s_reducts' % name) and os.path.isfile('%s_summary.npz' % name)
+
+
+def run_script(script, script_args):
+
+    print('running %s' % ' '.join([script] + script_args), flush=True)
+    subprocess.run([sys.executable, script] + script_args, check=True)
+
+
+def read_state():
+
+    if os.path.isfile(state_file):
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    else:
+        return {}
+
+
+def write_state(state):
+
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,351 +1,1148 @@
 #!/usr/bin/env python
 
+import argparse
+import hashlib
+import json
+import multiprocessing
 import numpy as np
 import os
 import pandas as pd
+import queue
+import time
+import zlib
 from config import *
-np.random.seed(0)
+from summary import *
+from tables import *
 
 
 if not os.path.isdir('results'):
     os.mkdir('results')
 
+# state of model at end of some years, for resuming runs
+# - file names are keys for buildings data and targets in effect in all years so far, so any scenario with the same history can use them
+# - each file has all years so far, so space grows with the square of the number of years saved (saving every year for all scenarios takes about 3 times the space of their results, and every 5 years less than their results)
+# - files are never removed, since other runs may resume from them (delete checkpoints/ when done)
+checkpoint_dir = 'checkpoints'
+
+# hash of this file, so state saved by other versions of the model is not used
+with open(os.path.abspath(__file__), 'rb') as f:
+    model_code_hash = hashlib.sha256(f.read()).hexdigest()
+
+# percentiles of replicates to write in ensemble mode
+ensemble_percentiles = [5, 25, 50, 75, 95]
+
+# processes started by this process to run groups of scenarios in parallel (--jobs)
+branch_procs = []
+
+# time spent in each stage, when profiling (--profile)
+# - stats are [time, calls, rows] by stack of names (scenarios, year or finish, stage)
+# - None unless profiling, so stages only check whether to time themselves
+# - written to profile.json and to profile.folded (collapsed stacks in microseconds, for flame graphs)
+profile = None
+profile_file = 'profile'
+
+# positions of years, policies, and fuels in model state arrays
+yidx = dict(zip(years, range(len(years))))
+pidx = dict(zip(policies, range(len(policies))))
+fidx = dict(zip(fuels, range(len(fuels))))
+
+# compiled target fields
+# - types are flags by type code, with an extra code for types not in bldg_types
+# - missing years are zero and missing values are nan
+target_dtype = np.dtype([('start year', np.int64),
+                         ('end year', np.int64),
+                         ('types', np.bool_, (len(bldg_types)+1,)),
+                         ('min area', np.float64),
+                         ('max area', np.float64),
+                         ('avg year', np.int64),
+                         ('reduct prop', np.float64),
+                         ('targ val', np.float64),
+                         ('bldg prop', np.float64),
+                         ('fuel prop', np.float64),
+                         ('coef of perf', np.float64)])
+
+# target keys that each policy needs
+required_keys = {'tuneup': ['years','reduct prop'],
+                 'eui': ['years','avg year'],
+                 'ghg': ['years','bldg prop'],
+                 'electrify': ['years','bldg prop','fuel prop','coef of perf']}
+
 
 def main():
 
-    for scenario in scenarios:
-        print(scenario)
-        data = pd.read_csv('buildings.csv')
-        compute(data, scenario)
+    parser = argparse.ArgumentParser(description='run the model to compute energy reductions')
+    parser.add_argument('--jobs', type=int, default=1, help='number of scenarios to run in parallel')
+    parser.add_argument('--format', choices=table_formats, default=table_formats[0], help='file format for results')
+    parser.add_argument('--compression', choices=list(csv_compressions.keys()), default='none', help='compression for csv results, with --format csv or --long (default: none)')
+    parser.add_argument('--long', action='store_true', help='write results as csv with a row for each building, year, policy, and fuel (instead of a column for each)')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios, default=scenarios, help='scenarios to run (default: all)')
+    parser.add_argument('--no-share', action='store_true', help='run each scenario from the beginning instead of sharing years with the same targets')
+    parser.add_argument('--checkpoint-years', type=int, default=0, metavar='N', help='save state every N years (default: never)')
+    parser.add_argument('--resume', action='store_true', help='start from latest saved state that matches each scenario')
+    parser.add_argument('--replicates', type=int, default=0, metavar='N', help='run N replicates of random sampling and write percentiles of totals (default: one run with full results)')
+    parser.add_argument('--validate', choices=['warn','fail','skip'], default='warn', help='print problems in results, stop at first scenario with problems, or skip checks (default: warn)')
+    parser.add_argument('--profile', action='store_true', help='time each stage of each year and write %s.json and %s.folded' % (profile_file,profile_file))
+    args = parser.parse_args()
+
+    # only csv results are compressed
+    if (args.compression != 'none') and (args.format != 'csv') and not args.long:
+        parser.error('--compression needs --format csv or --long')
+
+    opts = {'format': args.format,
+            'compression': args.compression,
+            'long': args.long,
+            'checkpoint years': args.checkpoint_years,
+            'resume': args.resume,
+            'replicates': args.replicates,
+            'profile': args.profile,
+            'validate': args.validate}
+    reps = max(args.replicates, 1)
+    if args.profile:
+        start_profile()
+
+    data = read_table('buildings')
+    models = dict((scenario, setup_scenario(data, scenario, reps)) for scenario in args.scenarios)
+
+    # scenarios that have the same targets in effect up to some year share state up to that year
+    # - compute shared years once, then copy state for each group of scenarios that differ after that
+    # - with --no-share, run each scenario from the beginning
+    if args.no_share:
+        branches = [[scenario] for scenario in args.scenarios]
+    else:
+        branches = [args.scenarios]
+
+    # with --jobs, run groups of scenarios in other processes when they split off, while fewer than N processes are running
+    # - processes are forked, so each one starts with buildings data and state at the split instead of copying them
+    # - a group that splits off when all jobs are busy runs in the same process, and its own groups can run in other processes when they split off later
+    # - each process writes results for each scenario as soon as they are done
+    if args.jobs > 1:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context('fork')
+            opts['jobs'] = ctx.Semaphore(args.jobs - 1)
+            opts['branch queue'] = ctx.Queue()
+        else:
+            print('running scenarios one at a time, since --jobs needs processes to be forked')
+
+    run_groups(data, models, branches, init_state(data, reps), 1, opts)
+    if 'jobs' in opts:
+        wait_branches(opts)
+
+    if args.profile:
+        write_profile()
+
+
+def start_branch(data, models, group, state, y, opts):
+
+    # run group in a forked process (with a copy of state), if a job is free
+    # - processes started by this one are waited for when it exits
+    if ('jobs' not in opts) or not opts['jobs'].acquire(block=False):
+        return False
+    proc = multiprocessing.get_context('fork').Process(target=run_forked_branch, args=(data,models,group,state,y,opts))
+    proc.start()
+    branch_procs.append(proc)
+
+    return True
+
+
+def run_forked_branch(data, models, group, state, y, opts):
+
+    # run group, then free its job and send profile stats and number of processes started to main process
+    # - processes keep their own profile stats (not copies of stats for years before the split)
+    global branch_procs
+    branch_procs = []
+    if profile is not None:
+        profile['stats'] = {}
+    failed = True
+    try:
+        run_branch(data, models, group, state, y, opts)
+        failed = False
+    finally:
+        opts['jobs'].release()
+        opts['branch queue'].put({'stats': profile['stats'] if profile is not None else None,
+                                  'started': len(branch_procs),
+                                  'failed': failed})
+
+
+def wait_branches(opts):
+
+    # wait for all processes (including ones started by other processes), adding their profile stats
+    # - main process frees its own job, since it only waits from now on
+    # - a process that dies without sending a message (e.g., killed) is noticed once all processes started by main process have exited
+    opts['jobs'].release()
+    running = len(branch_procs)
+    failed = 0
+    while running > 0:
+        alive = any(proc.is_alive() for proc in branch_procs)
+        try:
+            msg = opts['branch queue'].get(timeout=1)
+        except queue.Empty:
+            if not alive:
+                raise RuntimeError('%d scenario processes exited without finishing' % running)
+            continue
+        running += msg['started'] - 1
+        failed += msg['failed']
+        if msg['stats'] is not None:
+            add_profile_stats(msg['stats'])
+    for proc in branch_procs:
+        proc.join()
+    if failed:
+        raise RuntimeError('%d scenario processes failed' % failed)
+
+
+def report(scenario, seconds):
+
+    # time for years computed for scenario (including years shared with other scenarios) and for writing its results
+    print('%s (%.1f s)' % (scenario, seconds), flush=True)
+
+
+def compute(data, scenario, fmt='npz', checkpoint_years=0, resume=False, validate='warn', compression='none', long=False):
+
+    # run one scenario on its own
+    # - call start_profile() first to time stages, and write_profile() after
+    opts = {'format': fmt,
+            'compression': compression,
+            'long': long,
+            'checkpoint years': checkpoint_years,
+            'resume': resume,
+            'replicates': 0,
+            'profile': profile is not None,
+            'validate': validate}
+    run_branch(data, {scenario: setup_scenario(data, scenario)}, [scenario], init_state(data), 1, opts)
+
 
+def run_branch(data, models, group, state, y, opts):
+
+    # run years that all scenarios in group share, then run each group of scenarios that differ after that
+    y, groups = run_shared_years(models, group, state, y, opts)
+    if y == len(years):
+        for scenario in group:
+            set_profile_group([scenario])
+            if opts['replicates']:
+                finish_ensemble(data, scenario, state, opts)
+            else:
+                finish_scenario(data, scenario, state, opts)
+    else:
+        run_groups(data, models, groups, state, y, opts)
+
+
+def run_groups(data, models, groups, state, y, opts):
+
+    # run each group of scenarios from state at position y, in another process if a job is free
+    # - state for last group is not copied, since nothing else needs it
+    for g in range(len(groups)):
+        if g == len(groups)-1:
+            run_branch(data, models, groups[g], state, y, opts)
+        elif not start_branch(data, models, groups[g], state, y, opts):
+            run_branch(data, models, groups[g], copy_state(state), y, opts)
+
+
+def run_shared_years(models, group, state, y, opts):
+
+    # step through years (starting from position y) while all scenarios in group have the same targets in effect
+    # - return position of first year that differs and scenarios grouped by their targets in that year
+    # - if resuming, skip to latest saved state in years that group shares
+    if opts['resume']:
+        y = resume_state(models, group, state, y)
+    while y < len(years):
+        groups = {}
+        for scenario in group:
+            groups.setdefault(models[scenario]['year keys'][y], []).append(scenario)
+        if len(groups) > 1:
+            return y, list(groups.values())
+        set_profile_group(group)
+        start = time.perf_counter()
+        step(models[group[0]], state, years[y])
+        if opts['checkpoint years'] and ((years[y] - years[0]) % opts['checkpoint years'] == 0):
+            tick = timer()
+            write_checkpoint(models[group[0]]['state keys'][y], state, y)
+            record((str(years[y]),'checkpoint'), tick)
+        state['seconds'] += time.perf_counter() - start
+        y += 1
+
+    return y, [group]
+
+
+def resume_state(models, group, state, y):
+
+    # find years (starting from position y) that all scenarios in group share
+    end_y = y
+    while (end_y < len(years)) and (len(set(models[scenario]['year keys'][end_y] for scenario in group)) == 1):
+        end_y += 1
+
+    # read latest saved state in those years, and return position of year after it
+    for ckpt_y in range(end_y-1, y-1, -1):
+        file_name = checkpoint_file(models[group[0]]['state keys'][ckpt_y])
+        if os.path.isfile(file_name):
+            read_checkpoint(file_name, state, ckpt_y)
+            print('resuming %s after %d' % (', '.join(group),years[ckpt_y]))
+            return ckpt_y + 1
+
+    return y
+
+
+def checkpoint_file(state_key):
+
+    return os.path.join(checkpoint_dir,'%s.npz' % state_key)
+
+
+def write_checkpoint(state_key, state, y):
+
+    # save state at end of year in position y
+    # - only save years computed so far
+    # - random numbers do not need to be saved, since each target and year gets its own generator
+    # - write to temporary file first, so a run that dies while writing does not leave a partial file
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    vals = {'ens': state['ens'][:, :y+1],
+            'reducts': state['reducts'][:, :y+1],
+            'elec years': state['elec years']}
+    for policy in ['tuneup','eui','ghg']:
+        vals['%s start years' % policy] = state['start years'][policy]
+        vals['next %s start years' % policy] = state['next start years'][policy]
+    file_name = checkpoint_file(state_key)
+    tmp_file_name = '%s.%d.tmp' % (file_name,os.getpid())
+    with open(tmp_file_name, 'wb') as f:
+        np.savez_compressed(f, **vals)
+    os.replace(tmp_file_name, file_name)
+
+
+def read_checkpoint(file_name, state, y):
+
+    # read state at end of year in position y (into arrays of state)
+    with np.load(file_name) as f:
+        state['ens'][:, :y+1] = f['ens']
+        state['reducts'][:, :y+1] = f['reducts']
+        state['elec years'][:] = f['elec years']
+        for policy in ['tuneup','eui','ghg']:
+            state['start years'][policy][:] = f['%s start years' % policy]
+            state['next start years'][policy][:] = f['next %s start years' % policy]
+
+
+def setup_scenario(data, scenario, reps=1):
+
+    # replicates are copies of all buildings, one after another, that only differ in random sampling
+    # - targets apply to each copy of a building, so compliance and electrification are sampled for each replicate
+    set_profile_group([scenario])
+    tick = timer()
+    num_bldgs = len(data)
+    area = data['area'].to_numpy(dtype=float)
+    type_codes = data['type code'].to_numpy()
+
+    # compile targets, find targets in effect in each year, and find buildings that each target applies to
+    # - building membership does not change over time, so only find it once per scenario
+    targs = {'tuneup': compile_targets(get_tuneup_targets(scenario), 'tuneup'),
+             'eui': compile_targets(get_eui_targets(scenario), 'eui'),
+             'ghg': compile_targets(get_ghg_targets(scenario), 'ghg'),
+             'electrify': compile_targets(get_electrify_targets(scenario), 'electrify')}
+    year_targs = {}
+    targ_idxs = {}
+    targ_keys = {}
+    for policy in policies:
+        year_targs[policy] = index_targets_by_year(targs[policy])
+        targ_idxs[policy] = [find_target_bldgs(target, type_codes, area) for target in targs[policy]]
+        targ_keys[policy] = get_target_keys(targs[policy])
+
+    # find buildings that will comply with each ghg target (in each replicate)
+    # - compliant buildings are the same every year
+    for t in range(len(targs['ghg'])):
+        target = targs['ghg'][t]
+        num_comp_bldgs = int(round(len(targ_idxs['ghg'][t]) * target['bldg prop']))
+        comp_idxs = []
+        for r in range(reps):
+            rng = get_rng('ghg', *targ_keys['ghg'][t], *replicate_keys(r))
+            comp_idxs.append(np.sort(rng.choice(targ_idxs['ghg'][t], size=num_comp_bldgs, replace=False)) + r*num_bldgs)
+        targ_idxs['ghg'][t] = np.concatenate(comp_idxs)
+    for policy in ['tuneup','eui','electrify']:
+        targ_idxs[policy] = [np.concatenate([targ_idx + r*num_bldgs for r in range(reps)]) for targ_idx in targ_idxs[policy]]
+
+    # targets in effect in each year (as positions in years)
+    # - scenarios with the same keys in every year up to some year have the same state in that year
+    year_keys = []
+    for year in years:
+        year_keys.append(tuple(tuple((targs[policy][t].tobytes(), targ_keys[policy][t][1]) for t in year_targs[policy][year]) for policy in policies))
 
-def compute(data, scenario):
+    # keys for state at end of each year (model code, settings, buildings data, replicates, and targets in effect in all years so far)
+    # - editing run-model.py or settings in config.py that the model uses never matches state saved before
+    state_keys = []
+    h = hashlib.sha256()
+    h.update(model_code_hash.encode('utf-8'))
+    h.update(repr([list(years), fuels, policies, bldg_types, sorted(ghg_factors.items()), rand_seed]).encode('utf-8'))
+    h.update(str(reps).encode('utf-8'))
+    h.update(type_codes.tobytes())
+    h.update(area.tobytes())
+    for fuel in fuels:
+        h.update(data['%d %s' % (years[0],fuel)].to_numpy(dtype=float).tobytes())
+    for y in range(len(years)):
+        if y > 0:
+            h.update(repr(year_keys[y]).encode('utf-8'))
+        state_keys.append(h.hexdigest()[:32])
+
+    model = {'replicates': reps,
+             'area': np.tile(area, reps),
+             'targs': targs,
+             'year targs': year_targs,
+             'targ idxs': targ_idxs,
+             'targ keys': targ_keys,
+             'year keys': year_keys,
+             'state keys': state_keys}
+    record(('setup',), tick, 1, num_bldgs * reps)
+
+    return model
+
+
+def init_state(data, reps=1):
+
+    num_bldgs = len(data) * reps
 
     # starting year for annual rates (for readjusting rates when other policies end)
+    start_years = {}
+    next_start_years = {}
     for policy in ['tuneup','eui','ghg']:
-        data['%s start year' % policy] = 0
-        data['next %s start year' % policy] = 0
+        start_years[policy] = np.zeros(num_bldgs, dtype=np.int64)
+        next_start_years[policy] = np.zeros(num_bldgs, dtype=np.int64)
 
     # year in which a building electrified
-    data['elec year'] = np.nan
+    elec_years = np.full(num_bldgs, np.nan)
 
-    for year in years[1:]:
+    # energy use by [building, year, fuel] and reductions by [building, year, policy, fuel]
+    # - fortran order so values for all buildings in one year are contiguous
+    # - reductions are zero unless a policy sets them
+    ens = np.zeros((num_bldgs, len(years), len(fuels)), order='F')
+    for fuel in fuels:
+        ens[:, yidx[years[0]], fidx[fuel]] = np.tile(data['%d %s' % (years[0],fuel)].to_numpy(dtype=float), reps)
+    reducts = np.zeros((num_bldgs, len(years), len(policies), len(fuels)), order='F')
 
-        # initialize reductions to zero
-        for policy in policies:
+    # time spent computing years so far (for reporting)
+    # - copies of state keep it, so each scenario is reported with time for years it shares with other scenarios
+    state = {'start years': start_years,
+             'next start years': next_start_years,
+             'elec years': elec_years,
+             'ens': ens,
+             'reducts': reducts,
+             'seconds': 0.0}
+
+    return state
+
+
+def copy_state(state):
+
+    new_state = {}
+    for key in state.keys():
+        if isinstance(state[key], dict):
+            new_state[key] = dict((policy, vals.copy()) for policy, vals in state[key].items())
+        elif isinstance(state[key], np.ndarray):
+            new_state[key] = state[key].copy(order='K')
+        else:
+            new_state[key] = state[key]
+
+    return new_state
+
+
+def step(model, state, year):
+
+    # compute reductions and energy use in year
+    targs, year_targs, targ_idxs = model['targs'], model['year targs'], model['targ idxs']
+    start_years, next_start_years = state['start years'], state['next start years']
+    elec_years, ens, reducts = state['elec years'], state['ens'], state['reducts']
+    num_bldgs = len(elec_years)
+    area = model['area']
+    reps = model['replicates']
+    y = yidx[year]
+    tick = timer()
+
+    # compute tuneup reductions
+    # - reduce each fuel by specified proportion
+    # - reduce equal amount each year
+    for t in year_targs['tuneup'][year]:
+        target = targs['tuneup'][t]
+        targ_idx = targ_idxs['tuneup'][t]
+        targ_start_year, targ_end_year = target['start year'], target['end year']
+
+        # if beginning of policy, set start year for tuneup policy
+        # - keep that start year unless another policy sets it to next year
+        if year == targ_start_year:
+            set_start_years(start_years, next_start_years, 'tuneup', targ_idx, year)
+
+        # compute target energy, starting energy, energy reduction, and annual reduction for each fuel
+        started, start_ys, num_years = get_start_years(start_years['tuneup'][targ_idx], targ_end_year)
+        for fuel in fuels:
+            target_ens = ens[targ_idx, yidx[targ_start_year-1], fidx[fuel]] * (1.0 - target['reduct prop'])
+            start_ens = np.full(len(targ_idx), np.nan)
+            start_ens[started] = ens[targ_idx[started], start_ys, fidx[fuel]]
+            en_reducts = start_ens - target_ens
+            en_reducts[en_reducts < 0.0] = 0.0
+            ann_reducts = np.full(len(targ_idx), np.nan)
+            ann_reducts[started] = en_reducts[started] / num_years
+            reducts[targ_idx, y, pidx['tuneup'], fidx[fuel]] = ann_reducts
+
+        # if end of policy, set next start year for other non-electrify policies
+        if year == targ_end_year:
+            for policy in ['eui','ghg']:
+                next_start_years[policy][targ_idx] = year + 1
+
+    tick = record_policy(model, 'tuneup', year, tick)
+
+    # compute eui reductions
+    # - reduce eui to average eui in specified year
+    # - average eui is over areas and types of buildings that target applies to
+    # - reduce equal amount each year
+    for t in year_targs['eui'][year]:
+        target = targs['eui'][t]
+        targ_idx = targ_idxs['eui'][t]
+        targ_start_year, targ_end_year = target['start year'], target['end year']
+
+        # if beginning of policy, set start year for eui policy
+        # - keep that start year unless another policy sets it to next year
+        if year == targ_start_year:
+            set_start_years(start_years, next_start_years, 'eui', targ_idx, year)
+
+        # compute target energy
+        target_year = target['avg year']
+        target_year_ens = np.zeros(len(targ_idx))
+        for fuel in fuels:
+            target_year_ens += ens[targ_idx, yidx[target_year], fidx[fuel]]
+        target_eui = replicate_means(target_year_ens / area[targ_idx], reps)
+        target_ens = target_eui * area[targ_idx]
+
+        # compute starting energy
+        started, start_ys, num_years = get_start_years(start_years['eui'][targ_idx], targ_end_year)
+        start_ens = np.zeros(len(targ_idx))
+        for fuel in fuels:
+            start_ens[started] += ens[targ_idx[started], start_ys, fidx[fuel]]
+
+        # compute energy reductions
+        en_reducts = start_ens - target_ens
+        en_reducts[en_reducts < 0.0] = 0.0
+
+        # compute annual reduction for each fuel
+        # - maintain proportion of fuels (based on site energy)
+        for fuel in fuels:
+            ann_reducts = np.full(len(targ_idx), np.nan)
+            fuel_en = ens[targ_idx[started], start_ys, fidx[fuel]]
+            fuel_ratio = fuel_en / start_ens[started]
+            ann_reducts[started] = fuel_ratio * en_reducts[started] / num_years
+            reducts[targ_idx, y, pidx['eui'], fidx[fuel]] = ann_reducts
+
+        # subtract reductions due to earlier policies
+        for fuel in fuels:
+            reducts[targ_idx, y, pidx['eui'], fidx[fuel]] -= reducts[targ_idx, y, pidx['tuneup'], fidx[fuel]]
+            clip_negatives(reducts[:, y, pidx['eui'], fidx[fuel]], targ_idx)
+
+        # if end of policy, set next start year for other non-electrify policies
+        if year == targ_end_year:
+            for policy in ['tuneup','ghg']:
+                next_start_years[policy][targ_idx] = year + 1
+
+    tick = record_policy(model, 'eui', year, tick)
+
+    # compute ghg reductions
+    # - reduce ghg intensity to average in specified year
+    # - average is over areas and types of buildings that target applies to
+    # - only a specified proportion of buildings comply
+    # - reduce equal amount each year, except change amount once in electrification year
+    for t in year_targs['ghg'][year]:
+        target = targs['ghg'][t]
+        comp_idx = targ_idxs['ghg'][t]
+        targ_start_year, targ_end_year = target['start year'], target['end year']
+
+        # if beginning of policy, set start year for ghg policy
+        # - keep that start year unless another policy sets it to next year
+        if year == targ_start_year:
+            set_start_years(start_years, next_start_years, 'ghg', comp_idx, year)
+
+        # compute target ghgs (if target is average ghg intensity in specified year)
+        if target['avg year'] != 0:
+            target_year = target['avg year']
+            target_year_ghgs = np.zeros(len(comp_idx))
+            for fuel in fuels:
+                target_year_ghgs += ens[comp_idx, yidx[target_year], fidx[fuel]] * ghg_factors[fuel]
+            target_ghg_int = replicate_means(target_year_ghgs / area[comp_idx], reps)
+            target_ghgs = target_ghg_int * area[comp_idx]
+
+        # compute target ghgs (if target is specified percentage of ghgs in year before start)
+        elif not np.isnan(target['reduct prop']):
+            target_ghgs = np.zeros(len(comp_idx))
             for fuel in fuels:
-                data['%d %s %s reduct' % (year,policy,fuel)] = 0.0
-
-        # compute tuneup reductions
-        # - reduce each fuel by specified proportion
-        # - reduce equal amount each year
-        for target in get_tuneup_targets(scenario):
-
-            # find buildings that target applies to
-            targ_idx = pd.Series(index=data.index, data=True)
-            if 'types' in target.keys():
-                targ_idx &= data['type'].isin(target['types'])
-            if 'not types' in target.keys():
-                targ_idx &= ~data['type'].isin(target['not types'])
-            if 'areas' in target.keys():
-                min_area, max_area = target['areas']
-                targ_idx &= data['area'] >= min_area
-                targ_idx &= data['area'] < max_area
-
-            targ_start_year, targ_end_year = target['years']
-            if (year >= targ_start_year) and (year <= targ_end_year):
-
-                # if beginning of policy, set start year for tuneup policy
-                # - keep that start year unless another policy sets it to next year
-                if year == targ_start_year:
-                    data.loc[targ_idx,'tuneup start year'] = year
-                    oth_idx = data['next tuneup start year'] == year + 1
-                    data.loc[targ_idx & ~oth_idx,'next tuneup start year'] = year
-
-                # compute target energy, starting energy, energy reduction, and annual reduction for each fuel
-                for fuel in fuels:
-                    target_ens = data.loc[targ_idx, '%d %s' % (targ_start_year-1,fuel)] * (1.0 - target['reduct prop'])
-                    start_ens = pd.Series(index=data.loc[targ_idx].index, data=np.nan)
-                    for start_year in set(data.loc[targ_idx,'tuneup start year']).difference([0]):
-                        idx = data.loc[targ_idx,'tuneup start year'] == start_year
-                        start_ens.loc[idx] = data.loc[targ_idx, '%d %s' % (start_year-1,fuel)].loc[idx]
-                    en_reducts = start_ens - target_ens
-                    en_reducts.loc[en_reducts < 0.0] = 0.0
-                    ann_reducts = pd.Series(index=data.loc[targ_idx].index, data=np.nan)
-                    for start_year in set(data.loc[targ_idx,'tuneup start year']).difference([0]):
-                        idx = data.loc[targ_idx,'tuneup start year'] == start_year
-                        ann_reducts.loc[idx] = en_reducts.loc[idx] / float(targ_end_year - start_year + 1)
-                    data.loc[targ_idx, '%d tuneup %s reduct' % (year,fuel)] = ann_reducts
-
-                # if end of policy, set next start year for other non-electrify policies
-                if year == targ_end_year:
-                    for policy in ['eui','ghg']:
-                        data.loc[targ_idx, 'next %s start year' % policy] = year + 1
-
-        # compute eui reductions
-        # - reduce eui to average eui in specified year
-        # - average eui is over areas and types of buildings that target applies to
-        # - reduce equal amount each year
-        for target in get_eui_targets(scenario):
-
-            # find buildings that target applies to
-            targ_idx = pd.Series(index=data.index, data=True)
-            if 'types' in target.keys():
-                targ_idx &= data['type'].isin(target['types'])
-            if 'not types' in target.keys():
-                targ_idx &= ~data['type'].isin(target['not types'])
-            if 'areas' in target.keys():
-                min_area, max_area = target['areas']
-                targ_idx &= data['area'] >= min_area
-                targ_idx &= data['area'] < max_area
-
-            targ_start_year, targ_end_year = target['years']
-            if (year >= targ_start_year) and (year <= targ_end_year):
-
-                # if beginning of policy, set start year for eui policy
-                # - keep that start year unless another policy sets it to next year
-                if year == targ_start_year:
-                    data.loc[targ_idx,'eui start year'] = year
-                    oth_idx = data['next eui start year'] == year + 1
-                    data.loc[targ_idx & ~oth_idx,'next eui start year'] = year
-
-                # compute target energy
-                target_year = target['avg year']
-                target_year_ens = pd.Series(index=data.loc[targ_idx].index, data=0.0)
-                for fuel in fuels:
-                    target_year_ens += data.loc[targ_idx, '%d %s' % (target_year,fuel)]
-                target_eui = (target_year_ens / data.loc[targ_idx,'area']).mean()
-                target_ens = target_eui * data.loc[targ_idx,'area']
-
-                # compute starting energy
-                start_ens = pd.Series(index=data.loc[targ_idx].index, data=0.0)
-                for start_year in set(data.loc[targ_idx,'eui start year']).difference([0]):
-                    idx = data.loc[targ_idx,'eui start year'] == start_year
-                    for fuel in fuels:
-                        start_ens.loc[idx] += data.loc[targ_idx, '%d %s' % (start_year-1,fuel)].loc[idx]
-
-                # compute energy reductions
-                en_reducts = start_ens - target_ens
-                en_reducts.loc[en_reducts < 0.0] = 0.0
-
-                # compute annual reduction for each fuel
-                # - maintain proportion of fuels (based on site energy)
-                for fuel in fuels:
-                    ann_reducts = pd.Series(index=data.loc[targ_idx].index, data=np.nan)
-                    for start_year in set(data.loc[targ_idx,'eui start year']).difference([0]):
-                        idx = data.loc[targ_idx,'eui start year'] == start_year
-                        fuel_en = data.loc[targ_idx, '%d %s' % (start_year-1,fuel)].loc[idx]
-                        fuel_ratio = fuel_en / start_ens.loc[idx]
-                        ann_reducts.loc[idx] = fuel_ratio * en_reducts.loc[idx] / float(targ_end_year - start_year + 1)
-                    data.loc[targ_idx, '%d eui %s reduct' % (year,fuel)] = ann_reducts
-
-                # subtract reductions due to earlier policies
-                for fuel in fuels:
-                    data.loc[targ_idx, '%d eui %s reduct' % (year,fuel)] -= data.loc[targ_idx, '%d tuneup %s reduct' % (year,fuel)]
-                    is_neg = data['%d eui %s reduct' % (year,fuel)] < 0.0
-                    data.loc[targ_idx & is_neg, '%d eui %s reduct' % (year,fuel)] = 0.0
-
-                # if end of policy, set next start year for other non-electrify policies
-                if year == targ_end_year:
-                    for policy in ['tuneup','ghg']:
-                        data.loc[targ_idx, 'next %s start year' % policy] = year + 1
+                target_ghgs += ens[comp_idx, yidx[targ_start_year-1], fidx[fuel]] * (1.0 - target['reduct prop']) * ghg_factors[fuel]
+
+        # compute target ghgs (if target is specified ghg intensity)
+        else:
+            target_ghgs = target['targ val'] * area[comp_idx]
+
+        # compute starting ghgs
+        started, start_ys, num_years = get_start_years(start_years['ghg'][comp_idx], targ_end_year)
+        start_ghgs = np.zeros(len(comp_idx))
+        for fuel in fuels:
+            start_ghgs[started] += ens[comp_idx[started], start_ys, fidx[fuel]] * ghg_factors[fuel]
 
         # compute ghg reductions
-        # - reduce ghg intensity to average in specified year
-        # - average is over areas and types of buildings that target applies to
-        # - only a specified proportion of buildings comply
-        # - reduce equal amount each year, except change amount once in electrification year
-        for target in get_ghg_targets(scenario):
-
-            # find buildings that target applies to
-            targ_idx = pd.Series(index=data.index, data=True)
-            if 'types' in target.keys():
-                targ_idx &= data['type'].isin(target['types'])
-            if 'not types' in target.keys():
-                targ_idx &= ~data['type'].isin(target['not types'])
-            if 'areas' in target.keys():
-                min_area, max_area = target['areas']
-                targ_idx &= data['area'] >= min_area
-                targ_idx &= data['area'] < max_area
-
-            # find buildings that will comply with target
-            num_bldgs = int(round(targ_idx.sum() * target['bldg prop']))
-            np.random.seed(0)
-            comp_idxs = np.random.choice(data.loc[targ_idx].index, size=num_bldgs, replace=False)
-            comp_idx = pd.Series(index=data.index, data=False)
-            comp_idx.loc[comp_idxs] = True
-
-            targ_start_year, targ_end_year = target['years']
-            if (year >= targ_start_year) and (year <= targ_end_year):
-
-                # if beginning of policy, set start year for ghg policy
-                # - keep that start year unless another policy sets it to next year
-                if year == targ_start_year:
-                    data.loc[comp_idx,'ghg start year'] = year
-                    oth_idx = data['next ghg start year'] == year + 1
-                    data.loc[comp_idx & ~oth_idx,'next ghg start year'] = year
-
-                # compute target ghgs (if target is average ghg intensity in specified year)
-                if 'avg year' in target.keys():
-                    target_year = target['avg year']
-                    target_year_ghgs = pd.Series(index=data.loc[comp_idx].index, data=0.0)
-                    for fuel in fuels:
-                        target_year_ghgs += data.loc[comp_idx, '%d %s' % (target_year,fuel)] * ghg_factors[fuel]
-                    target_ghg_int = (target_year_ghgs / data.loc[comp_idx,'area']).mean()
-                    target_ghgs = target_ghg_int * data.loc[comp_idx,'area']
-
-                # compute target ghgs (if target is specified percentage of ghgs in year before start)
-                elif 'reduct prop' in target.keys():
-                    target_ghgs = pd.Series(index=data.loc[comp_idx].index, data=0.0)
-                    for fuel in fuels:
-                        target_ghgs += data.loc[comp_idx, '%d %s' % (targ_start_year-1,fuel)] * (1.0 - target['reduct prop']) * ghg_factors[fuel]
-
-                # compute target ghgs (if target is specified ghg intensity)
-                elif 'targ val' in target.keys():
-                    target_ghgs = target['targ val'] * data.loc[comp_idx,'area']
-
-                else:
-                    target_ghgs = None
-
-                # compute starting ghgs
-                start_ghgs = pd.Series(index=data.loc[comp_idx].index, data=0.0)
-                for start_year in set(data.loc[comp_idx,'ghg start year']).difference([0]):
-                    idx = data.loc[comp_idx,'ghg start year'] == start_year
-                    for fuel in fuels:
-                        start_ghgs.loc[idx] += data.loc[comp_idx, '%d %s' % (start_year-1,fuel)].loc[idx] * ghg_factors[fuel]
-
-                # compute ghg reductions
-                ghg_reducts = start_ghgs - target_ghgs
-                ghg_reducts.loc[ghg_reducts < 0.0] = 0.0
-
-                # compute annual reduction for each fuel
-                # - maintain proportion of fuels (same whether based on site energy or ghg emissions)
-                for fuel in fuels:
-                    ann_reducts = pd.Series(index=data.loc[comp_idx].index, data=np.nan)
-                    for start_year in set(data.loc[comp_idx,'ghg start year']).difference([0]):
-                        idx = data.loc[comp_idx,'ghg start year'] == start_year
-                        fuel_ghg = data.loc[comp_idx, '%d %s' % (start_year-1,fuel)].loc[idx] * ghg_factors[fuel]
-                        fuel_ratio = fuel_ghg / start_ghgs.loc[idx]
-                        ann_reducts.loc[idx] = fuel_ratio * ghg_reducts.loc[idx] / float(targ_end_year - start_year + 1)
-                    data.loc[comp_idx, '%d ghg %s reduct' % (year,fuel)] = ann_reducts / ghg_factors[fuel]
-
-                # subtract reductions due to earlier policies
-                for fuel in fuels:
-                    data.loc[comp_idx, '%d ghg %s reduct' % (year,fuel)] -= data.loc[comp_idx, '%d tuneup %s reduct' % (year,fuel)]
-                    data.loc[comp_idx, '%d ghg %s reduct' % (year,fuel)] -= data.loc[comp_idx, '%d eui %s reduct' % (year,fuel)]
-                    is_neg = data['%d ghg %s reduct' % (year,fuel)] < 0.0
-                    data.loc[comp_idx & is_neg, '%d ghg %s reduct' % (year,fuel)] = 0.0
-
-                # if end of policy, set next start year for other non-electrify policies
-                if year == targ_end_year:
-                    for policy in ['tuneup','eui']:
-                        data.loc[comp_idx, 'next %s start year' % policy] = year + 1
-
-        # compute electrification reductions
-        # - replace non-electric load with electric load (according to coefficient of performance)
-        # - only replace a specified proportion of non-electric load
-        # - only a specified proportion of buildings electrify
+        ghg_reducts = start_ghgs - target_ghgs
+        ghg_reducts[ghg_reducts < 0.0] = 0.0
+
+        # compute annual reduction for each fuel
+        # - maintain proportion of fuels (same whether based on site energy or ghg emissions)
+        for fuel in fuels:
+            ann_reducts = np.full(len(comp_idx), np.nan)
+            fuel_ghg = ens[comp_idx[started], start_ys, fidx[fuel]] * ghg_factors[fuel]
+            fuel_ratio = fuel_ghg / start_ghgs[started]
+            ann_reducts[started] = fuel_ratio * ghg_reducts[started] / num_years
+            reducts[comp_idx, y, pidx['ghg'], fidx[fuel]] = ann_reducts / ghg_factors[fuel]
+
+        # subtract reductions due to earlier policies
+        for fuel in fuels:
+            reducts[comp_idx, y, pidx['ghg'], fidx[fuel]] -= reducts[comp_idx, y, pidx['tuneup'], fidx[fuel]]
+            reducts[comp_idx, y, pidx['ghg'], fidx[fuel]] -= reducts[comp_idx, y, pidx['eui'], fidx[fuel]]
+            clip_negatives(reducts[:, y, pidx['ghg'], fidx[fuel]], comp_idx)
+
+        # if end of policy, set next start year for other non-electrify policies
+        if year == targ_end_year:
+            for policy in ['tuneup','eui']:
+                next_start_years[policy][comp_idx] = year + 1
+
+    tick = record_policy(model, 'ghg', year, tick)
+
+    # compute electrification reductions
+    # - replace non-electric load with electric load (according to coefficient of performance)
+    # - only replace a specified proportion of non-electric load
+    # - only a specified proportion of buildings electrify
+    # - each building does all of its electrification in one year
+    # - equal proportion of buildings electrify each year
+    for t in year_targs['electrify'][year]:
+        target = targs['electrify'][t]
+        targ_idx = targ_idxs['electrify'][t]
+        targ_start_year, targ_end_year = target['start year'], target['end year']
+
+        # find buildings that will electrify this year
         # - each building does all of its electrification in one year
         # - equal proportion of buildings electrify each year
-        for target in get_electrify_targets(scenario):
-
-            # find buildings that target applies to
-            targ_idx = pd.Series(index=data.index, data=True)
-            if 'types' in target.keys():
-                targ_idx &= data['type'].isin(target['types'])
-            if 'not types' in target.keys():
-                targ_idx &= ~data['type'].isin(target['not types'])
-            if 'areas' in target.keys():
-                min_area, max_area = target['areas']
-                targ_idx &= data['area'] >= min_area
-                targ_idx &= data['area'] < max_area
-
-            targ_start_year, targ_end_year = target['years']
-            if (year >= targ_start_year) and (year <= targ_end_year):
-
-                # find buildings that will electrify this year
-                # - each building does all of its electrification in one year
-                # - equal proportion of buildings electrify each year
-                # - recompute each year to make sure total number matches target (because of rounding)
-                tot_num_bldgs = int(round(targ_idx.sum() * target['bldg prop']))
-                year_num_bldgs = int(round((tot_num_bldgs - data.loc[targ_idx,'elec year'].notnull().sum()) / float(targ_end_year - year + 1)))
-                nonelec_idx = targ_idx & data['elec year'].isnull()
-                year_idxs = np.random.choice(nonelec_idx.loc[nonelec_idx].index, size=year_num_bldgs, replace=False)
-                year_idx = pd.Series(index=data.index, data=False)
-                year_idx.loc[year_idxs] = True
-                data.loc[year_idx,'elec year'] = year
-
-                # for bldgs that electrified, set next start year for all non-electrify policies
-                for policy in ['tuneup','eui','ghg']:
-                    data.loc[year_idx, 'next %s start year' % policy] = year + 1
-
-                # compute reduction for each non-electric fuel
-                # - only for buildings that electrify this year
-                # - reduction is based on load after applying this year's reductions from earlier policies
-                for fuel in filter(lambda f: f != 'elec', fuels):
-                    fuel_amt = data.loc[year_idx, '%d %s' % (year-1,fuel)]
-                    fuel_amt -= data.loc[year_idx, '%d tuneup %s reduct' % (year,fuel)]
-                    fuel_amt -= data.loc[year_idx, '%d eui %s reduct' % (year,fuel)]
-                    fuel_amt -= data.loc[year_idx, '%d ghg %s reduct' % (year,fuel)]
-                    data.loc[year_idx, '%d electrify %s reduct' % (year,fuel)] = target['fuel prop'] * fuel_amt
-                    is_neg = data['%d electrify %s reduct' % (year,fuel)] < 0.0
-                    data.loc[year_idx & is_neg, '%d electrify %s reduct' % (year,fuel)] = 0.0
-
-                # compute (negative) electric reductions using (positive) non-electric reductions
-                # - only for buildings that electrify this year
-                # - use coefficient of performance to replace non-electric with electric
-                data.loc[year_idx, '%d electrify elec reduct' % year] = 0.0
-                for fuel in filter(lambda f: f != 'elec', fuels):
-                    fuel_reduct = data.loc[year_idx, '%d electrify %s reduct' % (year,fuel)]
-                    data.loc[year_idx, '%d electrify elec reduct' % year] -= fuel_reduct / float(target['coef of perf'])
-
-        # propogate start years for non-electrify policies
+        # - recompute each year to make sure total number matches target (because of rounding)
+        # - sample separately for each replicate
+        year_idxs = []
+        for rep_idx in targ_idx.reshape((reps,-1)):
+            tot_num_bldgs = int(round(len(rep_idx) * target['bldg prop']))
+            is_nonelec = np.isnan(elec_years[rep_idx])
+            year_num_bldgs = int(round((tot_num_bldgs - (~is_nonelec).sum()) / float(targ_end_year - year + 1)))
+            rng = get_rng('electrify', *model['targ keys']['electrify'][t], year, *replicate_keys(len(year_idxs)))
+            year_idxs.append(np.sort(rng.choice(rep_idx[is_nonelec], size=year_num_bldgs, replace=False)))
+        year_idx = np.concatenate(year_idxs)
+        elec_years[year_idx] = year
+
+        # for bldgs that electrified, set next start year for all non-electrify policies
         for policy in ['tuneup','eui','ghg']:
-            data['%s start year' % policy] = data['next %s start year' % policy]
+            next_start_years[policy][year_idx] = year + 1
 
-        # compute reductions due to each fuel
-        for fuel in fuels:
-            data['%d %s reduct' % (year,fuel)] = 0.0
-            for policy in policies:
-                data['%d %s reduct' % (year,fuel)] += data['%d %s %s reduct' % (year,policy,fuel)]
+        # compute reduction for each non-electric fuel
+        # - only for buildings that electrify this year
+        # - reduction is based on load after applying this year's reductions from earlier policies
+        for fuel in filter(lambda f: f != 'elec', fuels):
+            fuel_amt = ens[year_idx, yidx[year-1], fidx[fuel]]
+            fuel_amt -= reducts[year_idx, y, pidx['tuneup'], fidx[fuel]]
+            fuel_amt -= reducts[year_idx, y, pidx['eui'], fidx[fuel]]
+            fuel_amt -= reducts[year_idx, y, pidx['ghg'], fidx[fuel]]
+            reducts[year_idx, y, pidx['electrify'], fidx[fuel]] = target['fuel prop'] * fuel_amt
+            clip_negatives(reducts[:, y, pidx['electrify'], fidx[fuel]], year_idx)
+
+        # compute (negative) electric reductions using (positive) non-electric reductions
+        # - only for buildings that electrify this year
+        # - use coefficient of performance to replace non-electric with electric
+        reducts[year_idx, y, pidx['electrify'], fidx['elec']] = 0.0
+        for fuel in filter(lambda f: f != 'elec', fuels):
+            fuel_reduct = reducts[year_idx, y, pidx['electrify'], fidx[fuel]]
+            reducts[year_idx, y, pidx['electrify'], fidx['elec']] -= fuel_reduct / float(target['coef of perf'])
 
-        # compute reductions due to each policy
+    tick = record_policy(model, 'electrify', year, tick)
+
+    # propogate start years for non-electrify policies
+    for policy in ['tuneup','eui','ghg']:
+        start_years[policy] = next_start_years[policy].copy()
+
+    # compute new energy use
+    for fuel in fuels:
+        fuel_reducts = np.zeros(num_bldgs)
         for policy in policies:
-            data['%d %s reduct' % (year,policy)] = 0.0
-            for fuel in fuels:
-                data['%d %s reduct' % (year,policy)] += data['%d %s %s reduct' % (year,policy,fuel)]
+            fuel_reducts += reducts[:, y, pidx[policy], fidx[fuel]]
+        ens[:, y, fidx[fuel]] = ens[:, y-1, fidx[fuel]] - fuel_reducts
+    record((str(year),'energy use'), tick, 1, num_bldgs)
 
-        # compute new energy use
-        for fuel in fuels:
-            data['%d %s' % (year,fuel)] = data['%d %s' % (year-1,fuel)] - data['%d %s reduct' % (year,fuel)]
 
-    # check for nans
-    for col in filter(lambda c: c != 'elec year', data.columns):
-        idx = data[col].isnull()
-        if idx.any():
-            print('found %d bldgs with nan in column "%s"' % (idx.sum(),col))
+def finish_scenario(data, scenario, state, opts):
 
-    # check for negative energy use
-    approx_zero = -1e-6
-    for year in years:
-        for fuel in fuels:
-            col = '%d %s' % (year,fuel)
-            idx = data[col] < approx_zero
-            if idx.any():
-                print('found %d bldgs with negatives in column "%s"' % (idx.sum(),col))
+    # check results, before writing anything
+    start = time.perf_counter()
+    tick = timer()
+    check_results(data, scenario, state, opts['validate'])
+    record(('finish','validation'), tick, 1, len(state['ens']))
+
+    # write results, and remove replicates from any earlier --replicates run (which may be for other buildings data or targets)
+    name = write_results(data, scenario, state, opts)
+    if os.path.isfile('%s_ensemble.npz' % name):
+        os.remove('%s_ensemble.npz' % name)
 
-    # check for negative non-electric reductions
+    report(scenario, state['seconds'] + time.perf_counter() - start)
+
+
+def finish_ensemble(data, scenario, state, opts):
+
+    # check results of all replicates
+    start = time.perf_counter()
+    tick = timer()
+    check_results(data, scenario, state, opts['validate'])
+    record(('finish','validation'), tick, 1, len(state['ens']))
+
+    # write results of first replicate, which are the same as results without --replicates (since it has the same random numbers)
+    # - so bands are always drawn with lines from the same run
+    reps = opts['replicates']
+    num_bldgs = len(state['ens']) // reps
+    name = write_results(data, scenario, replicate_state(state, 0, num_bldgs), opts)
+
+    # total energy use by [replicate, year, fuel]
+    tick = timer()
+    ens = state['ens']
+    totals = np.zeros((reps, len(years), len(fuels)))
+    for r in range(reps):
+        totals[r] = ens[r*num_bldgs:(r+1)*num_bldgs].sum(axis=0)
+
+    # percentiles over replicates of total energy use and emissions by [percentile, year]
+    ghgs = np.zeros((reps, len(years)))
+    for fuel in fuels:
+        ghgs += totals[:, :, fidx[fuel]] * ghg_factors[fuel]
+    en_bands = np.percentile(totals.sum(axis=2), ensemble_percentiles, axis=0)
+    ghg_bands = np.percentile(ghgs, ensemble_percentiles, axis=0)
+
+    with open('%s_ensemble.npz' % name, 'wb') as f:
+        np.savez(f, percentiles=ensemble_percentiles, totals=totals, energy=en_bands, emissions=ghg_bands)
+    record(('finish','ensemble'), tick, 1, len(ens))
+
+    report(scenario, state['seconds'] + time.perf_counter() - start)
+
+
+def replicate_state(state, r, num_bldgs):
+
+    # state of buildings in replicate r (as views of arrays in state)
+    idx = slice(r*num_bldgs, (r+1)*num_bldgs)
+    rep_state = {}
+    for key in state.keys():
+        if isinstance(state[key], dict):
+            rep_state[key] = dict((policy, vals[idx]) for policy, vals in state[key].items())
+        elif isinstance(state[key], np.ndarray):
+            rep_state[key] = state[key][idx]
+        else:
+            rep_state[key] = state[key]
+
+    return rep_state
+
+
+def write_results(data, scenario, state, opts):
+
+    # write results and sums of results for scenario, and return name of results (without extension)
+    ens, reducts = state['ens'], state['reducts']
+
+    # sum results by building type and floor area (for plotting)
+    tick = timer()
+    summary = summarize(data['type code'].to_numpy(), data['area code'].to_numpy(), ens, reducts)
+    tick = record(('finish','summary'), tick, 1, len(data))
+
+    # write results in long layout (one year at a time), or write combined buildings data and results (a chunk of buildings at a time for csv) and reductions by policy and fuel
+    name = os.path.join('results',scenario.replace(' ','-'))
+    if opts['long']:
+        write_long_results(name, ens, reducts, opts['compression'])
+    else:
+        chunk_rows = csv_chunk_rows if opts['format'] == 'csv' else len(data)
+        write_table_chunks(get_result_chunks(data, state, chunk_rows), name, opts['format'], opts['compression'])
+        write_sparse_table(get_sparse_reducts(reducts), '%s_reducts' % name, opts['format'], opts['compression'])
+
+    # write sums
+    write_summary(summary, name)
+    record(('finish','write'), tick, 1, len(ens))
+
+    return name
+
+
+def check_results(data, scenario, state, mode):
+
+    # print problems found by validation, and stop if mode is fail
+    if mode == 'skip':
+        return
+    problems = validate(data, state)
+    for problem in problems:
+        print('%s: found %d bldgs with %s in column "%s" (worst %g, e.g., bldgs %s)' %
+              (scenario,problem['count'],problem['check'],problem['column'],problem['worst'],', '.join(map(str, problem['bldgs']))))
+    if problems and (mode == 'fail'):
+        raise ValueError('validation failed for %s (%d problems)' % (scenario,len(problems)))
+
+
+def validate(data, state):
+
+    # check buildings data and state for nans, negative energy use, and negative non-electric reductions
+    # - reductions are only checked after first year, and sums of reductions are not checked (since they have nans or negatives only if reductions do)
+    # - first year of energy use is checked in state instead of buildings data
+    # - return problems found, with column, number of buildings, worst value, and positions of first few buildings (in buildings data)
+    ens, reducts = state['ens'], state['reducts']
+    num_bldgs = len(data)
+    problems = []
+
+    data_cols = [col for col in data.columns if col not in ['%d %s' % (years[0],fuel) for fuel in fuels]]
+    find_problems(problems, data[data_cols].to_numpy(dtype=float), data_cols,
+                  np.ones(len(data_cols), dtype=bool), np.zeros(len(data_cols), dtype=bool), num_bldgs)
+
+    # energy use by [building, year and fuel] (in fortran order, so year changes fastest)
+    en_cols = ['%d %s' % (year,fuel) for fuel in fuels for year in years]
+    find_problems(problems, ens.reshape((len(ens),len(en_cols)), order='F'), en_cols,
+                  np.ones(len(en_cols), dtype=bool), np.ones(len(en_cols), dtype=bool), num_bldgs)
+
+    # reductions by [building, year and policy and fuel] (in fortran order, so year changes fastest, then policy)
+    reduct_cols = []
+    check_nans = []
+    check_negs = []
+    for fuel in fuels:
+        for policy in policies:
+            for year in years:
+                reduct_cols.append('%d %s %s reduct' % (year,policy,fuel))
+                check_nans.append(year != years[0])
+                check_negs.append((year != years[0]) and (fuel != 'elec'))
+    find_problems(problems, reducts.reshape((len(reducts),len(reduct_cols)), order='F'), reduct_cols,
+                  np.array(check_nans), np.array(check_negs), num_bldgs)
+
+    return problems
+
+
+def find_problems(problems, vals, cols, check_nans, check_negs, num_bldgs):
+
+    # find buildings with nans or negatives in each column of vals (by [building, column])
+    # - find columns that might have problems from minimum of each column (which is nan if column has any nans), in one pass over vals
+    # - only count problems in those columns
+    # - buildings in replicates are reported by position in buildings data
+    # - no buildings means no problems (and no minimums)
+    if len(vals) == 0:
+        return
     approx_zero = -1e-6
+    mins = vals.min(axis=0)
+    is_nan = np.isnan(mins)
+    for c in np.flatnonzero((is_nan & check_nans) | ((is_nan | (mins < approx_zero)) & check_negs)):
+        checks = []
+        if check_nans[c]:
+            checks.append(('nan', np.isnan(vals[:, c])))
+        if check_negs[c]:
+            checks.append(('negatives', vals[:, c] < approx_zero))
+        for check, flags in checks:
+            idx = np.flatnonzero(flags)
+            if len(idx):
+                problems.append({'check': check,
+                                 'column': cols[c],
+                                 'count': len(idx),
+                                 'worst': float(vals[idx, c].min()),
+                                 'bldgs': [int(i) for i in np.unique(idx % num_bldgs)[:5]]})
+
+
+def get_result_chunks(data, state, chunk_rows):
+
+    # combined buildings data and results, for a chunk of buildings at a time
+    # - with no buildings, one empty chunk (so results still have columns)
+    chunk_rows = max(chunk_rows, 1)
+    for start in range(0, max(len(data), 1), chunk_rows):
+        idx = slice(start, start + chunk_rows)
+        start_years = dict((policy, vals[idx]) for policy, vals in state['start years'].items())
+        next_start_years = dict((policy, vals[idx]) for policy, vals in state['next start years'].items())
+        yield get_results(data.iloc[idx], state['ens'][idx], state['reducts'][idx], start_years, next_start_years, state['elec years'][idx])
+
+
+def get_results(data, ens, reducts, start_years, next_start_years, elec_years):
+
+    # policy start years and electrification years
+    cols = {}
+    for policy in ['tuneup','eui','ghg']:
+        cols['%s start year' % policy] = start_years[policy]
+        cols['next %s start year' % policy] = next_start_years[policy]
+    cols['elec year'] = elec_years
+
+    # compute reductions due to each fuel and due to each policy (for all years at once)
+    fuel_reducts = np.zeros((len(data), len(years), len(fuels)), order='F')
+    for policy in policies:
+        fuel_reducts += reducts[:, :, pidx[policy], :]
+    policy_reducts = np.zeros((len(data), len(years), len(policies)), order='F')
+    for fuel in fuels:
+        policy_reducts += reducts[:, :, :, fidx[fuel]]
+
+    # reductions and energy use for each year
+    # - reductions by policy and fuel are kept separately, as sparse table (see get_sparse_reducts)
     for year in years[1:]:
+        for fuel in fuels:
+            cols['%d %s reduct' % (year,fuel)] = fuel_reducts[:, yidx[year], fidx[fuel]]
         for policy in policies:
-            for fuel in filter(lambda f: f != 'elec', fuels):
-                col = '%d %s %s reduct' % (year,policy,fuel)
-                idx = data[col] < approx_zero
-                if idx.any():
-                    print('found %d bldgs with negatives in column "%s"' % (idx.sum(),col))
-
-    # write data to file
-    data.to_csv(os.path.join('results','%s.csv' % scenario.replace(' ','-')), index=False)
+            cols['%d %s reduct' % (year,policy)] = policy_reducts[:, yidx[year], pidx[policy]]
+        for fuel in fuels:
+            cols['%d %s' % (year,fuel)] = ens[:, yidx[year], fidx[fuel]]
+
+    return pd.concat([data, pd.DataFrame(cols, index=data.index)], axis='columns')
+
+
+def get_sparse_reducts(reducts):
+
+    # reductions by policy and fuel for each year (after first year), as sparse table
+    # - most buildings have no reduction for most policies in most years (e.g., tuneups only in one year, electrification only in year a building electrifies)
+    # - keep (year, building, value) for nonzero reductions, in order of policy and fuel, then year
+    # - reductions for one policy and fuel are [building, year] in fortran order, so finding them does not copy reducts
+    columns = []
+    col_idxs = []
+    row_idxs = []
+    vals = []
+    for policy in policies:
+        for fuel in fuels:
+            policy_reducts = reducts[:, 1:, pidx[policy], fidx[fuel]]
+            ys, bldgs = np.nonzero(policy_reducts.T)
+            col_idxs.append(ys + len(columns))
+            row_idxs.append(bldgs)
+            vals.append(policy_reducts[bldgs, ys])
+            columns += ['%d %s %s reduct' % (year,policy,fuel) for year in years[1:]]
+
+    sparse = {'columns': columns,
+              'num rows': len(reducts),
+              'column': np.concatenate(col_idxs).astype(np.int32),
+              'row': np.concatenate(row_idxs).astype(np.int32),
+              'value': np.concatenate(vals)}
+
+    return sparse
+
+
+def start_profile():
+
+    global profile
+    profile = {'group': '', 'stats': {}}
+
+
+def set_profile_group(group):
+
+    # name of scenarios that stages being timed are for
+    if profile is not None:
+        profile['group'] = ', '.join(group)
+
+
+def timer():
+
+    if profile is None:
+        return None
+    return time.perf_counter()
+
+
+def record(names, tick, calls=1, rows=0):
+
+    # add time since tick (and calls and rows of buildings) to stats for stage, and return time to start timing next stage
+    if profile is None:
+        return None
+    now = time.perf_counter()
+    stats = profile['stats'].setdefault((profile['group'],) + names, [0.0, 0, 0])
+    stats[0] += now - tick
+    stats[1] += calls
+    stats[2] += rows
+
+    return now
+
+
+def record_policy(model, policy, year, tick):
+
+    # record stage for policy in year, with a call for each target and rows for buildings each target applies to
+    if profile is None:
+        return None
+    targ_idxs = [model['targ idxs'][policy][i] for i in model['year targs'][policy][year]]
+
+    return record((str(year),policy), tick, len(targ_idxs), sum(len(targ_idx) for targ_idx in targ_idxs))
+
+
+def add_profile_stats(stats):
+
+    # add stats from another process
+    for names in stats.keys():
+        totals = profile['stats'].setdefault(names, [0.0, 0, 0])
+        for i in range(len(totals)):
+            totals[i] += stats[names][i]
+
+
+def write_profile():
+
+    # stats for each stack of names, and totals for each stage
+    stages = []
+    totals = {}
+    for names in sorted(profile['stats'].keys()):
+        time_spent, calls, rows = profile['stats'][names]
+        stages.append({'stack': list(names), 'time': time_spent, 'calls': calls, 'rows': rows})
+        total = totals.setdefault(names[-1], {'time': 0.0, 'calls': 0, 'rows': 0})
+        total['time'] += time_spent
+        total['calls'] += calls
+        total['rows'] += rows
+    with open('%s.json' % profile_file, 'w') as f:
+        json.dump({'stages': stages, 'totals': totals}, f, indent=1)
+
+    # collapsed stacks (one line per stack, with time in microseconds)
+    with open('%s.folded' % profile_file, 'w') as f:
+        for stage in stages:
+            f.write('%s %d\n' % (';'.join(['run-model'] + stage['stack']),int(round(stage['time'] * 1e6))))
+
+    print('wrote %s.json and %s.folded' % (profile_file,profile_file))
+
+
+def write_long_results(name, ens, reducts, compression):
+
+    # write results to name_long.csv with columns bldg, year, policy, fuel, and value
+    # - bldg is position in buildings data
+    # - energy use is in rows with policy "energy use", for every building in every year
+    # - reductions are only in rows for nonzero reductions (after first year)
+    # - rows are written one year at a time (energy use, then reductions), so only one year of rows is in memory at once
+    num_bldgs = len(ens)
+    with open_csv('%s_long.csv%s' % (name,csv_compressions[compression]), 'w') as f:
+        for y in range(len(years)):
+            rows = {'bldg': np.tile(np.arange(num_bldgs), len(fuels)),
+                    'year': years[y],
+                    'policy': 'energy use',
+                    'fuel': np.repeat(fuels, num_bldgs),
+                    'value': ens[:, y].ravel(order='F')}
+            write_csv_rows(f, pd.DataFrame(rows), y == 0)
+
+            # reductions by [building, policy and fuel] (in fortran order, so policy changes fastest)
+            if y > 0:
+                year_reducts = reducts[:, y].reshape((num_bldgs,len(policies)*len(fuels)), order='F')
+                cols, bldgs = np.nonzero(year_reducts.T)
+                rows = {'bldg': bldgs,
+                        'year': years[y],
+                        'policy': np.array(policies)[cols % len(policies)],
+                        'fuel': np.array(fuels)[cols // len(policies)],
+                        'value': year_reducts[bldgs, cols]}
+                write_csv_rows(f, pd.DataFrame(rows), False)
+
+
+def compile_targets(targets, policy):
+
+    # convert list of target dicts into array of compiled targets
+    targs = np.zeros(len(targets), dtype=target_dtype)
+    for t in range(len(targets)):
+        target = targets[t]
+        for key in required_keys[policy]:
+            if key not in target.keys():
+                raise ValueError('%s target %d has no "%s"' % (policy,t,key))
+        if (policy == 'ghg') and not any(key in target.keys() for key in ['avg year','reduct prop','targ val']):
+            raise ValueError('ghg target %d has no "avg year", "reduct prop", or "targ val"' % t)
+
+        targs['start year'][t], targs['end year'][t] = target['years']
+
+        # find types that target applies to
+        types = np.ones(len(bldg_types)+1, dtype=bool)
+        if 'types' in target.keys():
+            types &= type_flags(target['types'])
+        if 'not types' in target.keys():
+            types &= ~type_flags(target['not types'])
+        targs['types'][t] = types
+
+        if 'areas' in target.keys():
+            targs['min area'][t], targs['max area'][t] = target['areas']
+        else:
+            targs['min area'][t], targs['max area'][t] = -np.inf, np.inf
+
+        targs['avg year'][t] = target.get('avg year', 0)
+        for key in ['reduct prop','targ val','bldg prop','fuel prop','coef of perf']:
+            targs[key][t] = target.get(key, np.nan)
+
+    return targs
+
+
+def type_flags(types):
+
+    # flags by type code for a list of building types
+    flags = np.zeros(len(bldg_types)+1, dtype=bool)
+    for typ in types:
+        if typ not in bldg_types:
+            raise ValueError('unknown building type "%s"' % typ)
+        flags[bldg_types.index(typ)] = True
+
+    return flags
+
+
+def index_targets_by_year(targs):
+
+    # find targets that are in effect in each year (in original order)
+    year_targs = {}
+    for year in years:
+        year_targs[year] = np.flatnonzero((targs['start year'] <= year) & (targs['end year'] >= year))
+
+    return year_targs
+
+
+def find_target_bldgs(target, type_codes, area):
+
+    # find positions of buildings that target applies to
+    targ_idx = target['types'][type_codes]
+    targ_idx &= area >= target['min area']
+    targ_idx &= area < target['max area']
+
+    return np.flatnonzero(targ_idx)
+
+
+def get_target_keys(targs):
+
+    # keys for random numbers for each target
+    # - keys depend on what target is (not on scenario or position), so same targets draw same numbers in all scenarios
+    # - identical targets in one list are told apart by how many came before them
+    keys = []
+    counts = {}
+    for target in targs:
+        key = zlib.crc32(target.tobytes())
+        keys.append((key, counts.get(key, 0)))
+        counts[key] = counts.get(key, 0) + 1
+
+    return keys
+
+
+def replicate_keys(r):
+
+    # extra keys for random numbers in replicate r
+    # - first replicate uses same numbers as a run without replicates
+    if r == 0:
+        return []
+    return ['replicate', r]
+
+
+def get_start_years(targ_start_years, targ_end_year):
+
+    # find buildings that have a start year for a policy, positions in years of year before their start years, and number of years from their start years to end of target
+    # - energy in year before start year for all buildings is then one lookup (instead of one for each start year)
+    # - years are consecutive, so positions are offsets from first year
+    started = targ_start_years != 0
+    start_ys = targ_start_years[started] - 1 - years[0]
+    num_years = (targ_end_year - targ_start_years[started] + 1).astype(float)
+
+    return started, start_ys, num_years
+
+
+def set_start_years(start_years, next_start_years, policy, targ_idx, year):
+
+    # set start year for policy
+    # - keep that start year unless another policy sets it to next year
+    start_years[policy][targ_idx] = year
+    oth_idx = next_start_years[policy][targ_idx] == year + 1
+    next_start_years[policy][targ_idx[~oth_idx]] = year
+
+
+def clip_negatives(vals, idx):
+
+    # set negative values to zero (only for specified buildings)
+    is_neg = vals[idx] < 0.0
+    vals[idx[is_neg]] = 0.0
+
+
+def replicate_means(vals, reps):
+
+    # average over buildings in each replicate (skipping nans), repeated for each building
+    # - vals has same number of buildings for each replicate, one replicate after another
+    means = [mean(rep_vals) for rep_vals in vals.reshape((reps,-1))]
+
+    return np.repeat(means, len(vals) // reps)
+
+
+def mean(vals):
+
+    # average, skipping nans (same as pandas)
+    is_nan = np.isnan(vals)
+    if is_nan.all():
+        return np.nan
+    return np.where(is_nan, 0.0, vals).sum() / float((~is_nan).sum())
 
 
 if __name__ == '__main__':
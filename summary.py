@@ -0,0 +1,46 @@
+import numpy as np
+from config import *
+
+
+# sums of results over buildings, by building type code and floor area code
+# - count: number of buildings by [type, area]
+# - energy: energy use by [year, fuel, type, area]
+# - reduct: reductions by [year, policy, fuel, type, area]
+# - type codes include an extra code for types not in bldg_types
+summary_shape = (len(bldg_types)+1, len(areas))
+
+
+def summarize(type_codes, area_codes, ens, reducts):
+
+    # sum energy use by [building, year, fuel] and reductions by [building, year, policy, fuel]
+    groups = type_codes * summary_shape[1] + area_codes
+    num_groups = summary_shape[0] * summary_shape[1]
+
+    counts = np.bincount(groups, minlength=num_groups)
+    en_sums = np.zeros((len(years), len(fuels), num_groups))
+    reduct_sums = np.zeros((len(years), len(policies), len(fuels), num_groups))
+    for y in range(len(years)):
+        for f in range(len(fuels)):
+            en_sums[y,f] = np.bincount(groups, weights=ens[:,y,f], minlength=num_groups)
+            for p in range(len(policies)):
+                reduct_sums[y,p,f] = np.bincount(groups, weights=reducts[:,y,p,f], minlength=num_groups)
+
+    summary = {'count': counts.reshape(summary_shape),
+               'energy': en_sums.reshape(en_sums.shape[:-1] + summary_shape),
+               'reduct': reduct_sums.reshape(reduct_sums.shape[:-1] + summary_shape)}
+
+    return summary
+
+
+def write_summary(summary, name):
+
+    with open('%s_summary.npz' % name, 'wb') as f:
+        np.savez(f, **summary)
+
+
+def read_summary(name):
+
+    with np.load('%s_summary.npz' % name) as f:
+        summary = dict((key, f[key]) for key in ['count','energy','reduct'])
+
+    return summary
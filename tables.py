@@ -0,0 +1,185 @@
+import gzip
+import io
+import numpy as np
+import os
+import pandas as pd
+
+
+# file formats for tables of buildings and results
+# - npz keeps one compressed array per column, so types are preserved and columns can be read separately
+# - csv is for sharing
+table_formats = ['npz','csv']
+
+# compression of csv files (and extension added to file name)
+# - zstd needs the zstandard package
+csv_compressions = {'none': '',
+                    'gzip': '.gz',
+                    'zstd': '.zst'}
+
+# rows of csv files formatted at a time, so text for only one chunk of rows is in memory at once
+csv_chunk_rows = 10000
+
+
+def write_table(data, name, fmt, compression='none'):
+
+    # write table to name.npz or name.csv (or compressed csv)
+    if fmt == 'npz':
+        cols = {}
+        for col in data.columns:
+            vals = data[col].to_numpy()
+            if vals.dtype.kind == 'O':
+                vals = vals.astype(str)
+            cols[col] = vals
+        with open('%s.npz' % name, 'wb') as f:
+            np.savez_compressed(f, __columns__=np.array(data.columns, dtype=str), **cols)
+    elif fmt == 'csv':
+        with open_csv('%s.csv%s' % (name,csv_compressions[compression]), 'w') as f:
+            write_csv_rows(f, data, True)
+    else:
+        raise ValueError('unknown table format "%s"' % fmt)
+
+
+def write_table_chunks(chunks, name, fmt, compression='none'):
+
+    # write table from chunks of rows
+    # - csv is written one chunk at a time, so the whole table is never in memory
+    # - npz needs whole columns, so chunks are combined first
+    if fmt == 'csv':
+        with open_csv('%s.csv%s' % (name,csv_compressions[compression]), 'w') as f:
+            header = True
+            for data in chunks:
+                write_csv_rows(f, data, header)
+                header = False
+    else:
+        chunks = list(chunks)
+        write_table(chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True), name, fmt)
+
+
+def write_csv_rows(f, data, header):
+
+    # write rows of data to open csv file, a chunk of rows at a time
+    for start in range(0, max(len(data), 1), csv_chunk_rows):
+        data.iloc[start:start+csv_chunk_rows].to_csv(f, header=header and (start == 0), index=False)
+
+
+def open_csv(file_name, mode):
+
+    # open csv file as text for reading ('r') or writing ('w'), compressed according to extension
+    if file_name.endswith(csv_compressions['gzip']):
+        return gzip.open(file_name, mode + 't', compresslevel=6, newline='')
+    elif file_name.endswith(csv_compressions['zstd']):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd compression needs the zstandard package')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor().stream_writer(open(file_name, 'wb'))
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'))
+        return io.TextIOWrapper(stream, newline='')
+    else:
+        return open(file_name, mode, newline='')
+
+
+def find_table(name):
+
+    # find file for table, using the one written last if there is more than one
+    exts = ['npz'] + ['csv%s' % ext for ext in csv_compressions.values()]
+    files = [f for f in ['%s.%s' % (name,ext) for ext in exts] if os.path.isfile(f)]
+    if not files:
+        raise IOError('no table found for "%s"' % name)
+
+    return max(files, key=os.path.getmtime)
+
+
+def read_columns(name):
+
+    # read names of columns in table
+    file_name = find_table(name)
+    if file_name.endswith('.npz'):
+        with np.load(file_name) as f:
+            return [str(col) for col in f['__columns__']]
+    else:
+        return list(pd.read_csv(file_name, nrows=0).columns)
+
+
+def read_table(name, columns=None):
+
+    # read table (or only specified columns of table)
+    # - csv numbers are parsed exactly, so they are the same as the numbers that were written
+    file_name = find_table(name)
+    if file_name.endswith('.npz'):
+        with np.load(file_name) as f:
+            if columns is None:
+                columns = [str(col) for col in f['__columns__']]
+            data = pd.DataFrame(dict((col, f[col]) for col in columns))
+    else:
+        data = pd.read_csv(file_name, usecols=columns, float_precision='round_trip')
+        if columns is not None:
+            data = data[columns]
+
+    return data
+
+
+# sparse tables are for many columns that are mostly zero
+# - kept as (column, row, value) for each nonzero value, with names of columns and number of rows
+# - npz keeps one array for each of those, csv has one line for each nonzero value (with name of column)
+def write_sparse_table(sparse, name, fmt, compression='none'):
+
+    # write sparse table to name.npz or name.csv (or compressed csv)
+    if fmt == 'npz':
+        with open('%s.npz' % name, 'wb') as f:
+            np.savez_compressed(f, columns=np.array(sparse['columns'], dtype=str), num_rows=sparse['num rows'],
+                                column=sparse['column'], row=sparse['row'], value=sparse['value'])
+    elif fmt == 'csv':
+        data = pd.DataFrame({'column': np.array(sparse['columns'], dtype=object)[sparse['column']],
+                             'row': sparse['row'],
+                             'value': sparse['value']})
+        with open_csv('%s.csv%s' % (name,csv_compressions[compression]), 'w') as f:
+            f.write('# columns: %d, rows: %d\n' % (len(sparse['columns']),sparse['num rows']))
+            f.write('# %s\n' % '|'.join(sparse['columns']))
+            write_csv_rows(f, data, True)
+    else:
+        raise ValueError('unknown table format "%s"' % fmt)
+
+
+def read_sparse_table(name):
+
+    # read sparse table (as written by write_sparse_table)
+    file_name = find_table(name)
+    if file_name.endswith('.npz'):
+        with np.load(file_name) as f:
+            sparse = {'columns': [str(col) for col in f['columns']],
+                      'num rows': int(f['num_rows']),
+                      'column': f['column'],
+                      'row': f['row'],
+                      'value': f['value']}
+    else:
+        with open_csv(file_name, 'r') as f:
+            num_rows = int(f.readline().split()[-1])
+            columns = f.readline()[2:].rstrip('\r\n').split('|')
+            data = pd.read_csv(f, dtype={'column': str, 'row': np.int64, 'value': float}, float_precision='round_trip')
+        col_idx = pd.Categorical(data['column'], categories=columns).codes
+        sparse = {'columns': columns,
+                  'num rows': num_rows,
+                  'column': col_idx.astype(np.int64),
+                  'row': data['row'].to_numpy(),
+                  'value': data['value'].to_numpy()}
+
+    return sparse
+
+
+def sparse_to_frame(sparse, columns=None):
+
+    # dense table (of all columns or only specified columns) from sparse table
+    if columns is None:
+        columns = sparse['columns']
+    col_map = np.full(len(sparse['columns']), -1)
+    for c in range(len(columns)):
+        col_map[sparse['columns'].index(columns[c])] = c
+    vals = np.zeros((sparse['num rows'], len(columns)), order='F')
+    cols = col_map[sparse['column']]
+    idx = cols >= 0
+    vals[sparse['row'][idx], cols[idx]] = sparse['value'][idx]
+
+    return pd.DataFrame(vals, columns=columns)